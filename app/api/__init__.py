@@ -1,10 +1,11 @@
 from fastapi import APIRouter
 
-from app.api.endpoints import auth, users, audio
+from app.api.endpoints import auth, users, audio, uploads
 
 api_router = APIRouter()
 
 # Подключаем роутеры с префиксами
 api_router.include_router(auth.router, prefix="/auth", tags=["Authentication"])
 api_router.include_router(users.router, prefix="/users", tags=["Users"])
-api_router.include_router(audio.router, prefix="/audio", tags=["Audio"])
\ No newline at end of file
+api_router.include_router(audio.router, prefix="/audio", tags=["Audio"])
+api_router.include_router(uploads.router, prefix="/audio/uploads", tags=["Resumable uploads"])
\ No newline at end of file
@@ -1,10 +1,11 @@
 from typing import Generator, Optional, AsyncGenerator
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials  # Используем для извлечения токена из заголовка
 from sqlalchemy.ext.asyncio import AsyncSession
 import jwt
 
 from app.core import security
+from app.core.admission import upload_admission
 from app.core.config import settings
 from app.db import models
 from app.db.session import get_db
@@ -14,16 +15,19 @@ from app.db import crud
 
 reusable_oauth2 = HTTPBearer()
 
-async def get_current_user(
-    db: AsyncSession = Depends(get_db),
-    credentials: Optional[HTTPAuthorizationCredentials] = Depends(reusable_oauth2)
-) -> models.User:
-    credentials_exception = HTTPException(
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
 
+
+async def get_access_token_payload(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(reusable_oauth2)
+) -> TokenPayload:
+    credentials_exception = _credentials_exception()
+
     if credentials is None or credentials.scheme.lower() != "bearer":
         raise credentials_exception
 
@@ -37,19 +41,32 @@ async def get_current_user(
     if not token:
         raise credentials_exception
 
-    token_data = security.verify_token(token)
+    token_data = security.token_verifier.verify(token)
 
     if not token_data or token_data.type != 'access':
         raise credentials_exception
 
+    # Отзыв проверяется по множеству в памяти, без запроса к БД
+    if security.revoked_tokens.is_revoked(token_data):
+        raise credentials_exception
+
     if token_data.sub is None:
         raise credentials_exception
 
+    return token_data
+
+
+async def get_current_user(
+    db: AsyncSession = Depends(get_db),
+    token_data: TokenPayload = Depends(get_access_token_payload),
+) -> models.User:
+    credentials_exception = _credentials_exception()
+
     try:
         user_id_str = str(token_data.sub)
 
         user_id = int(user_id_str)
-        user = await crud.get_user(db, user_id=user_id)
+        user = await crud.get_user_cached(db, user_id=user_id)
     except ValueError:
          raise credentials_exception
 
@@ -65,11 +82,54 @@ async def get_current_active_user(
     return current_user
 
 
+async def _get_user_from_db(db: AsyncSession, user: models.User) -> models.User:
+    # Права читаем из БД, а не из кэша: снятие прав в другом воркере должно действовать сразу
+    db_user = await crud.get_user(db, user.id)
+    if db_user is None:
+        raise _credentials_exception()
+    return db_user
+
+
+async def is_owner_or_superuser(db: AsyncSession, current_user: models.User, owner_id: int) -> bool:
+    """Доступ к чужим данным; права суперпользователя проверяются по БД только для чужих."""
+    if owner_id == current_user.id:
+        return True
+    return (await _get_user_from_db(db, current_user)).is_superuser
+
+
 async def get_current_active_superuser(
+    db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(get_current_active_user),
 ) -> models.User:
+    current_user = await _get_user_from_db(db, current_user)
     if not current_user.is_superuser:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN, detail="The user doesn't have enough privileges"
         )
-    return current_user
\ No newline at end of file
+    return current_user
+
+
+def _expected_upload_bytes(request: Request) -> int:
+    # Без Content-Length (chunked) резервируем размер одного файла: больше тело всё равно не пройдёт
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit():
+        return int(content_length)
+    return settings.MAX_UPLOAD_SIZE
+
+
+async def admit_upload(
+    request: Request,
+    current_user: models.User = Depends(get_current_active_user),
+) -> AsyncGenerator[None, None]:
+    """Допуск загрузки до чтения тела; место освобождается, когда обработчик закончил."""
+    async with upload_admission.admit(current_user.id, _expected_upload_bytes(request)):
+        yield
+
+
+async def admit_upload_chunk(
+    request: Request,
+    current_user: models.User = Depends(get_current_active_user),
+) -> AsyncGenerator[None, None]:
+    # Части докачиваемой загрузки ограничены только общими лимитами: частоту ограничивает создание сессий
+    async with upload_admission.admit(None, _expected_upload_bytes(request)):
+        yield
@@ -1,67 +1,429 @@
+import asyncio
+import mimetypes
 import os
-import uuid
-import shutil
-from pathlib import Path
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
+from email.utils import formatdate, parsedate_to_datetime
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, RedirectResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
+from typing import Optional, Tuple
 
 from app.api import deps
+from app.core import metrics, pagination, peaks, processing, storage, uploads
+from app.core.purge import blob_purger
+from app.core.config import settings
+from app.core.responses import FastJSONResponse
 from app.db import crud, models
 from app.schemas import audio as audio_schemas
-from app.core.config import settings
 
 router = APIRouter()
 
-@router.post("/upload", summary="Upload an audio file", response_model=audio_schemas.AudioFile)
+
+def _quota_exceeded() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=uploads.QUOTA_EXCEEDED,
+    )
+
+
+async def _check_quota(db: AsyncSession, owner_id: int) -> Tuple[Optional[int], Optional[int]]:
+    """Остаток квоты до начала приёма тела; соединение с БД на время загрузки отпускается."""
+    bytes_left, files_left = await crud.get_quota_left(db, owner_id)
+    await db.rollback()
+    if bytes_left == 0 or files_left == 0:
+        raise _quota_exceeded()
+    return bytes_left, files_left
+
+# Тело разбирается вручную (потоково), поэтому схему формы описываем для OpenAPI явно
+UPLOAD_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["filename", "file"],
+                    "properties": {
+                        "filename": {"type": "string", "description": "Desired filename for the audio"},
+                        "file": {"type": "string", "format": "binary", "description": "Audio file to upload"},
+                    },
+                }
+            }
+        },
+    }
+}
+
+@router.post(
+    "/upload",
+    summary="Upload an audio file",
+    response_model=audio_schemas.AudioFile,
+    dependencies=[Depends(deps.admit_upload)],
+    openapi_extra=UPLOAD_OPENAPI,
+)
 async def upload_audio(
-    *,
+    request: Request,
     db: AsyncSession = Depends(deps.get_db),
-    filename: str = Form(..., description="Desired filename for the audio"),
-    file: UploadFile = File(..., description="Audio file to upload"),
     current_user: models.User = Depends(deps.get_current_active_user),
 ):
+    owner_id = current_user.id
+    bytes_left, _ = await _check_quota(db, owner_id)
+    upload = await uploads.receive_multipart(request, dest_dir=storage.incoming_dir(), quota_bytes=bytes_left)
 
-    if not file.content_type or not file.content_type.startswith("audio/"):
+    filename = upload.fields.get("filename")
+    if not filename or not upload.files:
+        await upload.discard()
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid file type. Only audio files are allowed.",
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Both 'filename' and 'file' form fields are required.",
         )
 
-    _, file_extension = os.path.splitext(file.filename or "unknown.mp3")
-    server_filename = f"{uuid.uuid4()}{file_extension}"
-    upload_dir = Path(settings.UPLOADS_DIR)
-    file_path = upload_dir / server_filename
-    file_path_str = str(file_path.relative_to(Path('.').resolve()))
+    received = upload.files[0]
+    metrics.UPLOAD_BYTES.inc(received.size)
+    metrics.UPLOAD_DURATION.observe(received.elapsed)
+    metrics.UPLOAD_THROUGHPUT.observe(received.bytes_per_sec)
 
+    audio_in = audio_schemas.AudioFileCreate(filename=filename)
     try:
-        with open(file_path, "wb") as buffer:
-             shutil.copyfileobj(file.file, buffer)
-
-    except Exception as e:
-        if file_path.exists():
-             file_path.unlink()
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Could not save file: {e}",
+        metadata = await processing.probe_audio(received.path)
+        db_audio = await crud.create_audio_file(
+            db=db,
+            file_in=audio_in,
+            owner_id=owner_id,
+            digest=received.digest,
+            size=received.size,
+            temp_path=received.path,
+            metadata=metadata,
         )
     finally:
-        await file.close()
+        await upload.discard()
 
-    audio_in = audio_schemas.AudioFileCreate(filename=filename)
-    db_audio = await crud.create_audio_file(
-        db=db, file_in=audio_in, owner_id=current_user.id, server_filepath=file_path_str
+    if db_audio is None:
+        raise _quota_exceeded()
+    if db_audio.audio_format == "wav":
+        processing.schedule_peaks(db_audio.blob_digest, db_audio.filepath)
+    return db_audio
+
+
+BATCH_UPLOAD_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["files"],
+                    "properties": {
+                        "files": {
+                            "type": "array",
+                            "items": {"type": "string", "format": "binary"},
+                            "description": "Audio files; each one is stored under its own filename",
+                        },
+                    },
+                }
+            }
+        },
+    }
+}
+
+@router.post(
+    "/upload/batch",
+    summary="Upload several audio files in one request",
+    response_model=audio_schemas.BatchUploadResponse,
+    dependencies=[Depends(deps.admit_upload)],
+    openapi_extra=BATCH_UPLOAD_OPENAPI,
+)
+async def upload_audio_batch(
+    request: Request,
+    db: AsyncSession = Depends(deps.get_db),
+    current_user: models.User = Depends(deps.get_current_active_user),
+):
+    owner_id = current_user.id
+    bytes_left, files_left = await _check_quota(db, owner_id)
+    # Неподходящие файлы не валят весь запрос: они возвращаются в results со своим кодом ошибки
+    upload = await uploads.receive_multipart(
+        request,
+        dest_dir=storage.incoming_dir(),
+        max_files=settings.MAX_BATCH_FILES if files_left is None else min(settings.MAX_BATCH_FILES, files_left),
+        skip_invalid=True,
+        quota_bytes=bytes_left,
     )
 
-    return db_audio
+    results = [
+        audio_schemas.BatchUploadResult(filename=rejected.filename, status_code=rejected.status_code, detail=rejected.detail)
+        for rejected in upload.rejected
+    ]
+    accepted = []
+    for received in upload.files:
+        if not received.filename:
+            results.append(audio_schemas.BatchUploadResult(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Every file part needs a filename.",
+            ))
+            continue
+        metrics.UPLOAD_BYTES.inc(received.size)
+        metrics.UPLOAD_DURATION.observe(received.elapsed)
+        metrics.UPLOAD_THROUGHPUT.observe(received.bytes_per_sec)
+        accepted.append(received)
 
+    try:
+        if accepted:
+            # Заголовки разбираются параллельно в пуле процессов
+            probed = await asyncio.gather(*(processing.probe_audio(received.path) for received in accepted))
+            batch = [
+                (received.filename, received.digest, received.size, received.path, metadata)
+                for received, metadata in zip(accepted, probed)
+            ]
+            db_files = await crud.create_audio_files_batch(db, owner_id=owner_id, files=batch)
+            if db_files is None:
+                # Квоту успел занять параллельный запрос: пачка не записана целиком
+                results.extend(
+                    audio_schemas.BatchUploadResult(
+                        filename=received.filename,
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail=uploads.QUOTA_EXCEEDED,
+                    )
+                    for received in accepted
+                )
+                return audio_schemas.BatchUploadResponse(results=results)
+            wav_blobs = {db_file.blob_digest: db_file.filepath for db_file in db_files if db_file.audio_format == "wav"}
+            for digest, key in wav_blobs.items():
+                processing.schedule_peaks(digest, key)
+            results.extend(
+                audio_schemas.BatchUploadResult(filename=db_file.filename, status_code=status.HTTP_201_CREATED, file=db_file)
+                for db_file in db_files
+            )
+    finally:
+        await upload.discard()
+
+    return audio_schemas.BatchUploadResponse(results=results)
 
-@router.get("", summary="Get list of user's audio files", response_model=List[audio_schemas.AudioFileInfo])
+
+# Колонки берутся из схемы ответа, чтобы быстрый путь не разошёлся с документированным форматом
+LIST_COLUMNS = tuple(audio_schemas.AudioFileInfo.model_fields)
+
+@router.get(
+    "",
+    summary="Get list of user's audio files",
+    response_model=audio_schemas.AudioFilePage,
+    response_class=FastJSONResponse,
+)
 async def get_user_audio_files(
     db: AsyncSession = Depends(deps.get_db),
     current_user: models.User = Depends(deps.get_current_active_user),
-    skip: int = 0,
-    limit: int = 100
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(100, ge=1, le=1000),
 ):
-    audio_files = await crud.get_audio_files_by_owner(db, owner_id=current_user.id, skip=skip, limit=limit)
-    return [audio_schemas.AudioFileInfo.model_validate(f) for f in audio_files] # Pydantic v2
\ No newline at end of file
+    after = None
+    if cursor:
+        try:
+            after = pagination.decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid cursor",
+            )
+
+    # Берём на одну запись больше, чтобы понять, есть ли следующая страница
+    rows = await crud.get_audio_file_rows_by_owner(
+        db, owner_id=current_user.id, columns=LIST_COLUMNS, limit=limit + 1, after=after
+    )
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = pagination.encode_cursor(rows[-1]["created_at"], rows[-1]["id"])
+
+    # Строки уже типизированы драйвером БД: отдаём их напрямую через orjson, минуя
+    # построение моделей и повторную валидацию response_model (он остаётся для OpenAPI)
+    return FastJSONResponse({"items": rows, "next_cursor": next_cursor})
+
+
+@router.get(
+    "/search",
+    summary="Search user's audio files by filename",
+    response_model=audio_schemas.AudioFilePage,
+    response_class=FastJSONResponse,
+)
+async def search_user_audio_files(
+    db: AsyncSession = Depends(deps.get_db),
+    current_user: models.User = Depends(deps.get_current_active_user),
+    q: str = Query(..., min_length=1, max_length=200, description="Substring of the filename, case-insensitive"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(100, ge=1, le=1000),
+):
+    # Ранжированную выдачу всё равно нужно отсортировать целиком, поэтому курсор — смещение, а не keyset
+    offset = 0
+    if cursor:
+        try:
+            offset = pagination.decode_offset_cursor(cursor)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid cursor",
+            )
+
+    rows = await crud.search_audio_file_rows(
+        db, owner_id=current_user.id, query=q, columns=LIST_COLUMNS, limit=limit + 1, offset=offset
+    )
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = pagination.encode_offset_cursor(offset + limit)
+    return FastJSONResponse({"items": rows, "next_cursor": next_cursor})
+
+
+def _is_not_modified(request: Request, etag: str, last_modified: float) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # Слабое сравнение (RFC 9110): префикс W/ не учитывается
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag.removeprefix("W/") in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return int(last_modified) <= since.timestamp()
+
+    return False
+
+
+@router.api_route(
+    "/{file_id}/content",
+    methods=["GET", "HEAD"],
+    summary="Download an audio file (supports Range and conditional requests)",
+    response_class=FileResponse,
+)
+async def download_audio_file(
+    file_id: int,
+    request: Request,
+    db: AsyncSession = Depends(deps.get_db),
+    current_user: models.User = Depends(deps.get_current_active_user),
+):
+    audio_file = await crud.get_audio_file(db, file_id=file_id)
+    if audio_file is None or not await deps.is_owner_or_superuser(db, current_user, audio_file.owner_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Audio file not found",
+        )
+
+    media_type = mimetypes.guess_type(audio_file.filename)[0] or "application/octet-stream"
+    backend = storage.get_backend()
+    path = backend.local_path(audio_file.filepath)
+    if path is None:
+        # Объектное хранилище отдаёт файл само (с Range), сервис лишь проверяет доступ
+        if audio_file.blob_digest and _is_not_modified(request, f'"{audio_file.blob_digest}"', 0):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"etag": f'"{audio_file.blob_digest}"'})
+        url = await backend.download_url(audio_file.filepath, audio_file.filename, media_type)
+        return RedirectResponse(url, status_code=status.HTTP_307_TEMPORARY_REDIRECT)
+
+    try:
+        stat_result = await run_in_threadpool(os.stat, path)
+    except FileNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Audio file content is missing",
+        )
+
+    # Содержимое блоба неизменно, поэтому его SHA-256 — готовый сильный ETag
+    if audio_file.blob_digest:
+        etag = f'"{audio_file.blob_digest}"'
+    else:
+        etag = f'W/"{stat_result.st_size:x}-{int(stat_result.st_mtime):x}"'
+    headers = {
+        "etag": etag,
+        "last-modified": formatdate(stat_result.st_mtime, usegmt=True),
+        "cache-control": "private, no-cache",
+    }
+
+    if _is_not_modified(request, etag, stat_result.st_mtime):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    # Range/If-Range и 206 обрабатывает FileResponse; файл отдаётся блоками, а не читается в память целиком
+    return FileResponse(
+        path,
+        headers=headers,
+        media_type=media_type,
+        filename=audio_file.filename,
+        content_disposition_type="inline",
+        stat_result=stat_result,
+    )
+
+
+@router.get(
+    "/{file_id}/peaks",
+    summary="Get precomputed waveform peaks (int8 min/max pairs per bucket)",
+    response_class=Response,
+    responses={200: {"content": {"application/octet-stream": {}}}},
+)
+async def get_audio_peaks(
+    file_id: int,
+    request: Request,
+    level: int = Query(0, ge=0, lt=peaks.LEVEL_COUNT, description="0 is the most detailed level"),
+    db: AsyncSession = Depends(deps.get_db),
+    current_user: models.User = Depends(deps.get_current_active_user),
+):
+    audio_file = await crud.get_audio_file(db, file_id=file_id)
+    if audio_file is None or not await deps.is_owner_or_superuser(db, current_user, audio_file.owner_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Audio file not found",
+        )
+    if audio_file.audio_format != "wav" or not audio_file.blob_digest:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Waveform peaks are only available for PCM WAV files",
+        )
+
+    # Пики неизменны для содержимого, так что digest и уровень однозначно задают ETag
+    etag = f'"{audio_file.blob_digest}-peaks-{level}"'
+    headers = {"etag": etag, "cache-control": "private, no-cache"}
+    if request.headers.get("if-none-match") and _is_not_modified(request, etag, 0):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    try:
+        path = await processing.ensure_peaks(audio_file.blob_digest, audio_file.filepath)
+    except Exception as e:
+        # Заголовок похож на WAV, но разобрать его не удалось
+        print(f"Could not compute waveform peaks for blob {audio_file.blob_digest}: {e}")
+        path = None
+    if path is None:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Waveform peaks are only available for PCM WAV files",
+        )
+    result = await run_in_threadpool(peaks.read_level, str(path), level)
+    if result is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Peaks level not found",
+        )
+
+    samples_per_bucket, sample_rate, data = result
+    headers["x-peaks-samples-per-bucket"] = str(samples_per_bucket)
+    headers["x-peaks-sample-rate"] = str(sample_rate)
+    headers["x-peaks-bits"] = "8"
+    return Response(content=data, media_type="application/octet-stream", headers=headers)
+
+
+@router.delete("/{file_id}", summary="Delete an audio file", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_audio_file(
+    file_id: int,
+    db: AsyncSession = Depends(deps.get_db),
+    current_user: models.User = Depends(deps.get_current_active_user),
+):
+    audio_file = await crud.get_audio_file(db, file_id=file_id)
+    if audio_file is None or not await deps.is_owner_or_superuser(db, current_user, audio_file.owner_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Audio file not found",
+        )
+    if await crud.delete_audio_file(db, file_id) is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Audio file not found",
+        )
+    # Сам блоб удаляется в фоне, если на него больше никто не ссылается
+    blob_purger.notify()
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
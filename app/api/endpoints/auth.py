@@ -1,3 +1,4 @@
+import datetime
 from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
 from fastapi.responses import RedirectResponse
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -12,6 +13,12 @@ from app.schemas import user as user_schemas
 
 router = APIRouter()
 
+
+async def _revoke(db: AsyncSession, token_id: str, expires_at: datetime.datetime) -> None:
+    # В памяти — сразу для этого процесса, в БД — для остальных воркеров (RevocationSync)
+    await crud.revoke_token(db, token_id=token_id, expires_at=expires_at)
+    security.revoked_tokens.add(token_id, expires_at)
+
 @router.get("/yandex/login", summary="Redirect to Yandex for authentication")
 async def login_via_yandex():
     authorize_url = security.get_yandex_authorize_url()
@@ -42,26 +49,22 @@ async def handle_yandex_callback(
     last_name = yandex_user_info.get("last_name")
     display_name = yandex_user_info.get("display_name")
 
-    user = await crud.get_user_by_yandex_id(db, yandex_id=yandex_id)
-
     is_superuser = (str(yandex_id) == settings.FIRST_SUPERUSER_YANDEX_ID)
 
-    if user:
-        if user.is_superuser != is_superuser:
-            user = await crud.set_superuser_status(db, user=user, is_superuser=is_superuser)
-    else:
-        user_in = user_schemas.UserCreate(
-            yandex_id=yandex_id,
-            email=email,
-            first_name=first_name,
-            last_name=last_name,
-            display_name=display_name,
-            is_superuser=is_superuser
-        )
-        user = await crud.create_user(db=db, user_in=user_in)
+    user_in = user_schemas.UserCreate(
+        yandex_id=yandex_id,
+        email=email,
+        first_name=first_name,
+        last_name=last_name,
+        display_name=display_name,
+        is_superuser=is_superuser
+    )
+    user = await crud.upsert_user_from_yandex(db=db, user_in=user_in)
 
-    access_token = security.create_access_token(subject=user.id)
-    refresh_token = security.create_refresh_token(subject=user.id)
+    # Каждый вход — новая сессия: все токены её цепочки refresh несут один sid
+    session_id = security.new_session_id()
+    access_token = security.create_access_token(subject=user.id, session_id=session_id)
+    refresh_token = security.create_refresh_token(subject=user.id, session_id=session_id)
 
     return token_schemas.Token(
         access_token=access_token,
@@ -74,7 +77,7 @@ async def refresh_access_token(
     refresh_request: token_schemas.RefreshTokenRequest,
     db: AsyncSession = Depends(deps.get_db)
 ):
-    token_data = security.verify_token(refresh_request.refresh_token)
+    token_data = security.token_verifier.verify(refresh_request.refresh_token)
 
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -86,21 +89,50 @@ async def refresh_access_token(
         raise credentials_exception
 
     if token_data.sub is None:
-         raise credentials_exception
+        raise credentials_exception
 
     try:
         user_id = int(token_data.sub)
     except ValueError:
         raise credentials_exception
 
+    # Ротация: refresh-токен обменивается ровно один раз. Повторное предъявление значит,
+    # что токен утёк, поэтому закрывается вся сессия, включая уже выданные по ней токены.
+    # Обмен, сделанный этим воркером, виден в памяти, другими — по конфликту вставки в БД
+    if security.revoked_tokens.is_revoked(token_data):
+        if token_data.jti is not None and token_data.jti in security.revoked_tokens and token_data.sid is not None:
+            await _revoke(db, token_data.sid, security.session_expires_at())
+        raise credentials_exception
+
+    if token_data.jti is not None:
+        expires_at = datetime.datetime.fromtimestamp(token_data.exp, tz=datetime.timezone.utc)
+        if not await crud.revoke_token(db, token_id=token_data.jti, expires_at=expires_at):
+            if token_data.sid is not None:
+                await _revoke(db, token_data.sid, security.session_expires_at())
+            raise credentials_exception
+        security.revoked_tokens.add(token_data.jti, expires_at)
+
     user = await crud.get_user(db, user_id=user_id)
     if not user:
         raise credentials_exception
 
-    new_access_token = security.create_access_token(subject=user.id)
-    new_refresh_token = security.create_refresh_token(subject=user.id)
+    new_access_token = security.create_access_token(subject=user.id, session_id=token_data.sid)
+    new_refresh_token = security.create_refresh_token(subject=user.id, session_id=token_data.sid)
 
     return token_schemas.Token(
         access_token=new_access_token,
         refresh_token=new_refresh_token
-    )
\ No newline at end of file
+    )
+
+
+@router.post("/logout", summary="Revoke the current session's tokens", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(
+    db: AsyncSession = Depends(deps.get_db),
+    token_data: token_schemas.TokenPayload = Depends(deps.get_access_token_payload),
+):
+    if token_data.sid is not None:
+        # Отзыв sid закрывает и access-, и refresh-токены этой сессии
+        await _revoke(db, token_data.sid, security.session_expires_at())
+    elif token_data.jti is not None:
+        await _revoke(db, token_data.jti, datetime.datetime.fromtimestamp(token_data.exp, tz=datetime.timezone.utc))
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,260 @@
+import datetime
+import uuid
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api import deps
+from app.core import metrics, processing, storage, uploads
+from app.core.config import settings
+from app.db import crud, models
+from app.schemas import audio as audio_schemas
+
+router = APIRouter()
+
+# Докачиваемая загрузка (по мотивам tus): POST создаёт сессию, PATCH с заголовком Upload-Offset
+# присылает часть файла, GET показывает недостающие диапазоны, POST .../complete создаёт AudioFile.
+
+
+def _session_info(upload_session: models.UploadSession) -> audio_schemas.UploadSessionInfo:
+    return audio_schemas.UploadSessionInfo(
+        id=upload_session.id,
+        filename=upload_session.filename,
+        content_type=upload_session.content_type,
+        length=upload_session.length,
+        received_bytes=upload_session.received_bytes,
+        received=upload_session.received,
+        missing=uploads.missing_ranges(upload_session.received, upload_session.length),
+        expires_at=upload_session.updated_at + datetime.timedelta(seconds=settings.UPLOAD_SESSION_TTL_SECONDS),
+    )
+
+
+def _is_completing(upload_session: models.UploadSession) -> bool:
+    if upload_session.completing_at is None:
+        return False
+    age = datetime.datetime.now(datetime.timezone.utc) - upload_session.completing_at
+    return age < datetime.timedelta(seconds=settings.UPLOAD_COMPLETE_TIMEOUT_SECONDS)
+
+
+def _already_completing() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="Upload is already being completed",
+    )
+
+
+async def _get_session_or_404(
+    db: AsyncSession, upload_id: str, owner_id: int, for_update: bool = False
+) -> models.UploadSession:
+    upload_session = await crud.get_upload_session(db, upload_id, owner_id=owner_id, for_update=for_update)
+    if upload_session is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Upload session not found",
+        )
+    return upload_session
+
+
+@router.post(
+    "",
+    summary="Start a resumable upload",
+    response_model=audio_schemas.UploadSessionInfo,
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(deps.admit_upload)],
+)
+async def create_upload_session(
+    session_in: audio_schemas.UploadSessionCreate,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(deps.get_db),
+    current_user: models.User = Depends(deps.get_current_active_user),
+):
+    if not session_in.content_type.startswith("audio/"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid file type. Only audio files are allowed.",
+        )
+    if session_in.length > settings.MAX_RESUMABLE_UPLOAD_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File is too large. Maximum size is {settings.MAX_RESUMABLE_UPLOAD_SIZE} bytes.",
+        )
+    # Квота ещё раз проверяется при завершении: к тому моменту место могли занять другие загрузки
+    bytes_left, files_left = await crud.get_quota_left(db, current_user.id)
+    if files_left == 0 or (bytes_left is not None and session_in.length > bytes_left):
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=uploads.QUOTA_EXCEEDED,
+        )
+
+    upload_id = uuid.uuid4().hex
+    upload_session = await crud.create_upload_session(
+        db, upload_id=upload_id, owner_id=current_user.id, session_in=session_in
+    )
+    try:
+        await storage.allocate_file(storage.upload_session_path(upload_id), session_in.length)
+    except OSError as e:
+        print(f"Could not allocate upload {upload_id}: {e}")
+        await crud.delete_upload_session(db, upload_id, owner_id=current_user.id)
+        raise HTTPException(
+            status_code=status.HTTP_507_INSUFFICIENT_STORAGE,
+            detail="Could not reserve space for the upload",
+        )
+
+    response.headers["Location"] = str(request.url_for("get_upload_session", upload_id=upload_id))
+    return _session_info(upload_session)
+
+
+@router.get("/{upload_id}", summary="Get resumable upload progress", response_model=audio_schemas.UploadSessionInfo)
+async def get_upload_session(
+    upload_id: str,
+    db: AsyncSession = Depends(deps.get_db),
+    current_user: models.User = Depends(deps.get_current_active_user),
+):
+    upload_session = await _get_session_or_404(db, upload_id, current_user.id)
+    return _session_info(upload_session)
+
+
+@router.patch(
+    "/{upload_id}",
+    summary="Send a chunk of a resumable upload",
+    response_model=audio_schemas.UploadSessionInfo,
+    dependencies=[Depends(deps.admit_upload_chunk)],
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {"application/offset+octet-stream": {"schema": {"type": "string", "format": "binary"}}},
+        }
+    },
+)
+async def upload_chunk(
+    upload_id: str,
+    request: Request,
+    upload_offset: int = Header(..., alias="Upload-Offset", ge=0),
+    db: AsyncSession = Depends(deps.get_db),
+    current_user: models.User = Depends(deps.get_current_active_user),
+):
+    upload_session = await _get_session_or_404(db, upload_id, current_user.id)
+    remaining = upload_session.length - upload_offset
+    # Соединение с БД не держим, пока идёт тело запроса: часть может грузиться минутами
+    await db.rollback()
+    if _is_completing(upload_session):
+        raise _already_completing()
+
+    content_length = request.headers.get("content-length")
+    if remaining <= 0 or (content_length and content_length.isdigit() and int(content_length) > remaining):
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail="Chunk extends past the declared upload length.",
+        )
+
+    try:
+        written = await uploads.receive_range(
+            request, storage.upload_session_path(upload_id), upload_offset, remaining
+        )
+    except FileNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Upload session not found",
+        )
+    metrics.UPLOAD_BYTES.inc(written)
+
+    upload_session = await crud.record_upload_range(
+        db, upload_id=upload_id, start=upload_offset, end=upload_offset + written
+    )
+    if upload_session is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Upload session not found",
+        )
+    return _session_info(upload_session)
+
+
+@router.post(
+    "/{upload_id}/complete",
+    summary="Finish a resumable upload and create the audio file",
+    response_model=audio_schemas.AudioFile,
+)
+async def complete_upload(
+    upload_id: str,
+    db: AsyncSession = Depends(deps.get_db),
+    current_user: models.User = Depends(deps.get_current_active_user),
+):
+    # Под блокировкой строки только проверка и заявка: копирование и размещение файла идут без неё,
+    # а повторный complete за это время получает 409
+    upload_session = await _get_session_or_404(db, upload_id, current_user.id, for_update=True)
+    missing = uploads.missing_ranges(upload_session.received, upload_session.length)
+    if missing:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={"message": "Upload is incomplete", "missing": missing},
+        )
+    if _is_completing(upload_session):
+        await db.rollback()
+        raise _already_completing()
+    length = upload_session.length
+    claimed_at = await crud.claim_upload_session(db, upload_id=upload_id)
+
+    # PATCH не берёт блокировку сессии и может ещё писать в файл через открытый дескриптор.
+    # Поэтому хэшируется и коммитится собственная копия: запоздавшие байты останутся в файле сессии,
+    # а не попадут в общий блоб, который по digest получат и другие пользователи
+    path = storage.upload_session_path(upload_id)
+    snapshot = storage.incoming_dir() / f"{upload_id}.{uuid.uuid4().hex}.complete"
+    db_audio = None
+    try:
+        try:
+            digest, size = await run_in_threadpool(storage.snapshot_file, path, snapshot)
+        except FileNotFoundError:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Upload session not found",
+            )
+        if size != length:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Upload file size does not match the declared length",
+            )
+        metadata = await processing.probe_audio(snapshot)
+        await crud.store_blobs(db, [(digest, length, snapshot)])
+
+        # Строка блокируется снова только на удаление сессии и вставку файла
+        upload_session = await _get_session_or_404(db, upload_id, current_user.id, for_update=True)
+        if upload_session.completing_at != claimed_at:
+            await db.rollback()
+            raise _already_completing()
+        db_audio = await crud.finalize_upload_session(
+            db, upload_session=upload_session, digest=digest, metadata=metadata
+        )
+        if db_audio is None:
+            # Сессия и её файл остаются: после освобождения места complete можно повторить
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=uploads.QUOTA_EXCEEDED,
+            )
+    finally:
+        await storage.remove_files([snapshot])
+        if db_audio is None:
+            try:
+                await crud.release_upload_claim(db, upload_id=upload_id, claimed_at=claimed_at)
+            except Exception as e:
+                print(f"Could not release the complete claim of upload {upload_id}: {e}")
+    await storage.remove_files([path])
+    if db_audio.audio_format == "wav":
+        processing.schedule_peaks(digest, db_audio.filepath)
+    return db_audio
+
+
+@router.delete("/{upload_id}", summary="Cancel a resumable upload", status_code=status.HTTP_204_NO_CONTENT)
+async def cancel_upload(
+    upload_id: str,
+    db: AsyncSession = Depends(deps.get_db),
+    current_user: models.User = Depends(deps.get_current_active_user),
+):
+    if not await crud.delete_upload_session(db, upload_id, owner_id=current_user.id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Upload session not found",
+        )
+    await storage.remove_files([storage.upload_session_path(upload_id)])
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -3,6 +3,8 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 
 from app.api import deps
+from app.core.config import settings
+from app.core.purge import blob_purger
 from app.db import crud, models
 from app.schemas import user as user_schemas
 
@@ -14,6 +16,20 @@ async def read_users_me(
 ):
     return current_user
 
+@router.get("/me/usage", summary="Get current user's storage usage and quotas", response_model=user_schemas.UserUsage)
+async def read_usage_me(
+    db: AsyncSession = Depends(deps.get_db),
+    current_user: models.User = Depends(deps.get_current_active_user),
+):
+    # Счётчики читаются из БД, а не из кэша пользователей: одно обращение по первичному ключу
+    storage_bytes, file_count = await crud.get_user_usage(db, current_user.id) or (0, 0)
+    return user_schemas.UserUsage(
+        storage_bytes=storage_bytes,
+        file_count=file_count,
+        storage_quota=settings.USER_STORAGE_QUOTA,
+        file_quota=settings.USER_FILE_QUOTA,
+    )
+
 @router.patch("/me", summary="Update current user info", response_model=user_schemas.User)
 async def update_user_me(
     *,
@@ -21,7 +37,7 @@ async def update_user_me(
     user_in: user_schemas.UserUpdate,
     current_user: models.User = Depends(deps.get_current_active_user),
 ):
-    user = await crud.update_user(db=db, db_user=current_user, user_in=user_in)
+    user = await crud.update_user(db=db, user_id=current_user.id, user_in=user_in)
     return user
 
 @router.delete(
@@ -36,11 +52,12 @@ async def delete_user(
     current_superuser: models.User = Depends(deps.get_current_active_superuser)
 ):
 
-    user_to_delete = await crud.get_user(db, user_id=user_id)
-    if not user_to_delete:
+    deleted_user = await crud.delete_user(db=db, user_id=user_id)
+    if not deleted_user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="The user with this ID does not exist in the system",
         )
-    deleted_user = await crud.delete_user(db=db, user_id=user_id)
-    return user_to_delete
\ No newline at end of file
+    # Файлы на диске удаляются в фоне пачками
+    blob_purger.notify()
+    return deleted_user
\ No newline at end of file
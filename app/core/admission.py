@@ -0,0 +1,120 @@
+import contextlib
+import math
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, Optional
+
+from fastapi import HTTPException, status
+
+from app.core import metrics
+from app.core.config import settings
+
+# Допуск загрузок: общий лимит одновременных загрузок и байтов в полёте (503) и частота
+# загрузок каждого пользователя — token bucket (429). Отказ сразу, с Retry-After, а не очередь:
+# иначе клиенты копятся в ожидании и держат соединения. Всё в памяти процесса и из одного
+# event loop, поэтому без блокировок; при нескольких воркерах лимиты действуют на каждый.
+
+MAX_TRACKED_USERS = 100000  # вытесненный пользователь просто получает полный бакет
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        max_concurrent: int,
+        max_bytes_in_flight: int,
+        rate_per_user: float,
+        burst_per_user: int,
+        retry_after: int,
+    ):
+        self.max_concurrent = max_concurrent
+        self.max_bytes_in_flight = max_bytes_in_flight
+        self.rate_per_user = rate_per_user
+        self.burst_per_user = burst_per_user
+        self.retry_after = retry_after
+        self.active = 0
+        self.bytes_in_flight = 0
+        self.admitted = 0
+        self._buckets: "OrderedDict[int, list]" = OrderedDict()  # user_id -> [токены, время пополнения]
+
+    def _reject(self, status_code: int, reason: str, retry_after: int) -> HTTPException:
+        REJECTED.inc(reason=reason)
+        if status_code == status.HTTP_429_TOO_MANY_REQUESTS:
+            detail = "Too many uploads, retry later"
+        else:
+            detail = "Server is busy, retry later"
+        return HTTPException(
+            status_code=status_code,
+            detail=detail,
+            headers={"Retry-After": str(max(retry_after, 1))},
+        )
+
+    def _take_token(self, user_id: int) -> Optional[int]:
+        """Берёт токен из бакета пользователя; если пусто — через сколько секунд он появится."""
+        now = time.monotonic()
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            bucket = self._buckets[user_id] = [float(self.burst_per_user), now]
+            while len(self._buckets) > MAX_TRACKED_USERS:
+                self._buckets.popitem(last=False)
+        else:
+            bucket[0] = min(self.burst_per_user, bucket[0] + (now - bucket[1]) * self.rate_per_user)
+            bucket[1] = now
+            self._buckets.move_to_end(user_id)
+        if bucket[0] < 1.0:
+            return math.ceil((1.0 - bucket[0]) / self.rate_per_user)
+        bucket[0] -= 1.0
+        return None
+
+    @contextlib.asynccontextmanager
+    async def admit(self, user_id: Optional[int], expected_bytes: int) -> AsyncIterator[None]:
+        """Держит место на всё время загрузки; user_id=None — без лимита частоты."""
+        if self.max_concurrent and self.active >= self.max_concurrent:
+            raise self._reject(status.HTTP_503_SERVICE_UNAVAILABLE, "concurrency", self.retry_after)
+        # Файл крупнее всего бюджета пропускается только в одиночку, иначе он не прошёл бы никогда
+        if (
+            self.max_bytes_in_flight
+            and self.bytes_in_flight
+            and self.bytes_in_flight + expected_bytes > self.max_bytes_in_flight
+        ):
+            raise self._reject(status.HTTP_503_SERVICE_UNAVAILABLE, "bytes", self.retry_after)
+        # Токен берём последним, чтобы отказ по общим лимитам не тратил бюджет пользователя
+        if user_id is not None and self.rate_per_user > 0:
+            wait = self._take_token(user_id)
+            if wait is not None:
+                raise self._reject(status.HTTP_429_TOO_MANY_REQUESTS, "rate", wait)
+
+        self.active += 1
+        self.bytes_in_flight += expected_bytes
+        self.admitted += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self.bytes_in_flight -= expected_bytes
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": self.active,
+            "bytes_in_flight": self.bytes_in_flight,
+            "admitted": self.admitted,
+            "tracked_users": len(self._buckets),
+        }
+
+
+upload_admission = AdmissionController(
+    max_concurrent=settings.UPLOAD_MAX_CONCURRENT,
+    max_bytes_in_flight=settings.UPLOAD_MAX_BYTES_IN_FLIGHT,
+    rate_per_user=settings.UPLOAD_RATE_PER_USER,
+    burst_per_user=settings.UPLOAD_BURST_PER_USER,
+    retry_after=settings.UPLOAD_RETRY_AFTER_SECONDS,
+)
+
+REJECTED = metrics.registry.counter(
+    "upload_admission_rejected_total", "Uploads rejected by admission control", ("reason",)
+)
+metrics.registry.gauge(
+    "upload_admission",
+    "Upload admission state: uploads and bytes in flight",
+    lambda: [((name,), value) for name, value in upload_admission.stats().items()],
+    labelnames=("stat",),
+)
@@ -0,0 +1,255 @@
+import os
+import struct
+from dataclasses import dataclass
+from typing import BinaryIO, Optional
+
+# Разбор заголовков аудиоконтейнеров без сторонних библиотек. Модуль выполняется в дочерних
+# процессах (см. app.core.processing), поэтому не импортирует ничего из приложения.
+
+SNIFF_SIZE = 64 * 1024
+
+
+@dataclass(frozen=True)
+class AudioMetadata:
+    format: Optional[str] = None  # wav, mp3, flac, ogg или None, если контейнер не распознан
+    duration: Optional[float] = None  # секунды
+    sample_rate: Optional[int] = None
+    channels: Optional[int] = None
+    bitrate: Optional[int] = None  # бит/с (для VBR — средний)
+
+    def as_columns(self) -> dict:
+        return {
+            "audio_format": self.format,
+            "duration": self.duration,
+            "sample_rate": self.sample_rate,
+            "channels": self.channels,
+            "bitrate": self.bitrate,
+        }
+
+
+def _id3v2_size(header: bytes) -> int:
+    """Размер ID3v2-тега в начале файла (его ставят перед MP3 и иногда перед FLAC)."""
+    if len(header) < 10 or header[:3] != b"ID3":
+        return 0
+    size = 0
+    for byte in header[6:10]:
+        size = (size << 7) | (byte & 0x7F)  # syncsafe integer
+    footer = 10 if header[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def sniff_format(header: bytes) -> Optional[str]:
+    if header[:4] == b"RIFF" and header[8:12] == b"WAVE":
+        return "wav"
+    if header[:4] == b"OggS":
+        return "ogg"
+    offset = _id3v2_size(header)
+    if header[offset:offset + 4] == b"fLaC":
+        return "flac"
+    if offset or _find_mp3_frame(header, 0) is not None:
+        return "mp3"
+    return None
+
+
+def _average_bitrate(size: int, duration: Optional[float]) -> Optional[int]:
+    if not duration:
+        return None
+    return int(size * 8 / duration)
+
+
+# WAV
+
+def _parse_wav(f: BinaryIO, file_size: int) -> AudioMetadata:
+    f.seek(12)
+    channels = sample_rate = byte_rate = None
+    while True:
+        chunk_header = f.read(8)
+        if len(chunk_header) < 8:
+            break
+        chunk_id, chunk_size = struct.unpack("<4sI", chunk_header)
+        if chunk_id == b"fmt ":
+            fmt = f.read(chunk_size)
+            _, channels, sample_rate, byte_rate = struct.unpack("<HHII", fmt[:12])
+            f.seek(chunk_size % 2, os.SEEK_CUR)
+        elif chunk_id == b"data":
+            # 0xFFFFFFFF пишут программы, записывающие поток без финального размера
+            data_size = chunk_size if chunk_size != 0xFFFFFFFF else file_size - f.tell()
+            data_size = min(data_size, file_size - f.tell())
+            duration = data_size / byte_rate if byte_rate else None
+            return AudioMetadata("wav", duration, sample_rate, channels, byte_rate * 8 if byte_rate else None)
+        else:
+            f.seek(chunk_size + chunk_size % 2, os.SEEK_CUR)
+    return AudioMetadata("wav", None, sample_rate, channels, byte_rate * 8 if byte_rate else None)
+
+
+# FLAC
+
+def _parse_flac(f: BinaryIO, file_size: int, offset: int) -> AudioMetadata:
+    f.seek(offset + 4)
+    block_header = f.read(4)
+    if len(block_header) < 4 or block_header[0] & 0x7F != 0:  # первым всегда идёт STREAMINFO
+        return AudioMetadata("flac")
+    streaminfo = f.read(34)
+    if len(streaminfo) < 34:
+        return AudioMetadata("flac")
+    packed = int.from_bytes(streaminfo[10:18], "big")
+    sample_rate = packed >> 44
+    channels = ((packed >> 41) & 0x7) + 1
+    total_samples = packed & 0xFFFFFFFFF
+    duration = total_samples / sample_rate if sample_rate and total_samples else None
+    return AudioMetadata("flac", duration, sample_rate, channels, _average_bitrate(file_size, duration))
+
+
+# Ogg (Vorbis, Opus)
+
+def _last_granule(f: BinaryIO, file_size: int) -> Optional[int]:
+    f.seek(max(0, file_size - SNIFF_SIZE))
+    tail = f.read(SNIFF_SIZE)
+    position = tail.rfind(b"OggS")
+    if position < 0 or position + 14 > len(tail):
+        return None
+    return struct.unpack("<q", tail[position + 6:position + 14])[0]
+
+
+def _parse_ogg(f: BinaryIO, file_size: int) -> AudioMetadata:
+    f.seek(0)
+    page = f.read(SNIFF_SIZE)
+    if len(page) < 27:
+        return AudioMetadata("ogg")
+    segments = page[26]
+    packet = page[27 + segments:]
+
+    granule = _last_granule(f, file_size)
+    if packet[:7] == b"\x01vorbis" and len(packet) >= 28:
+        channels, sample_rate, _, nominal_bitrate = struct.unpack("<BIiI", packet[11:24])
+        duration = granule / sample_rate if granule and sample_rate else None
+        bitrate = _average_bitrate(file_size, duration) or (nominal_bitrate or None)
+        return AudioMetadata("ogg", duration, sample_rate, channels, bitrate)
+    if packet[:8] == b"OpusHead" and len(packet) >= 16:
+        channels, pre_skip, sample_rate = struct.unpack("<BHI", packet[9:16])
+        # Позиции гранул в Opus всегда идут в 48 кГц, sample_rate — лишь частота исходника
+        duration = max(granule - pre_skip, 0) / 48000 if granule else None
+        return AudioMetadata("ogg", duration, sample_rate or 48000, channels, _average_bitrate(file_size, duration))
+    return AudioMetadata("ogg")
+
+
+# MP3
+
+# Битрейты в кбит/с по (MPEG-1?, слой) и индексу из заголовка кадра
+_MP3_BITRATES = {
+    (True, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (True, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (True, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (False, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (False, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (False, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+_MP3_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+
+@dataclass(frozen=True)
+class _Mp3Frame:
+    mpeg1: bool
+    layer: int
+    bitrate: int
+    sample_rate: int
+    channels: int
+    length: int
+    samples: int
+
+
+def _parse_mp3_header(data: bytes, position: int) -> Optional[_Mp3Frame]:
+    if position + 4 > len(data):
+        return None
+    b0, b1, b2, b3 = data[position:position + 4]
+    if b0 != 0xFF or b1 & 0xE0 != 0xE0:
+        return None
+    version = (b1 >> 3) & 0x3
+    layer = 4 - ((b1 >> 1) & 0x3)
+    bitrate_index = b2 >> 4
+    rate_index = (b2 >> 2) & 0x3
+    if version == 1 or layer == 4 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    mpeg1 = version == 3
+    bitrate = _MP3_BITRATES[(mpeg1, layer)][bitrate_index] * 1000
+    sample_rate = _MP3_SAMPLE_RATES[version][rate_index]
+    padding = (b2 >> 1) & 0x1
+    if layer == 1:
+        samples = 384
+        length = (12 * bitrate // sample_rate + padding) * 4
+    else:
+        samples = 1152 if mpeg1 or layer == 2 else 576
+        length = samples // 8 * bitrate // sample_rate + padding
+    channels = 1 if b3 >> 6 == 3 else 2
+    return _Mp3Frame(mpeg1, layer, bitrate, sample_rate, channels, length, samples)
+
+
+def _find_mp3_frame(data: bytes, start: int) -> Optional[int]:
+    # Случайная пара байт 0xFFEx встречается и в мусоре, поэтому требуем, чтобы
+    # следом за найденным кадром шёл ещё один корректный заголовок
+    position = data.find(b"\xff", start)
+    while 0 <= position < len(data) - 4:
+        frame = _parse_mp3_header(data, position)
+        if frame is not None:
+            following = position + frame.length
+            if following + 4 > len(data) or _parse_mp3_header(data, following) is not None:
+                return position
+        position = data.find(b"\xff", position + 1)
+    return None
+
+
+def _parse_mp3(f: BinaryIO, file_size: int, offset: int) -> AudioMetadata:
+    f.seek(offset)
+    data = f.read(SNIFF_SIZE)
+    position = _find_mp3_frame(data, 0)
+    if position is None:
+        return AudioMetadata("mp3")
+    frame = _parse_mp3_header(data, position)
+
+    # VBR-файлы несут число кадров в заголовке Xing/Info (LAME) или VBRI (Fraunhofer)
+    frames = None
+    if frame.mpeg1:
+        side_info = 17 if frame.channels == 1 else 32
+    else:
+        side_info = 9 if frame.channels == 1 else 17
+    xing = position + 4 + side_info
+    if data[xing:xing + 4] in (b"Xing", b"Info"):
+        flags = struct.unpack(">I", data[xing + 4:xing + 8])[0]
+        if flags & 0x1:
+            frames = struct.unpack(">I", data[xing + 8:xing + 12])[0]
+    elif data[position + 36:position + 40] == b"VBRI":
+        frames = struct.unpack(">I", data[position + 50:position + 54])[0]
+
+    audio_size = file_size - offset - position
+    if frames:
+        duration = frames * frame.samples / frame.sample_rate
+        bitrate = _average_bitrate(audio_size, duration)
+    else:
+        f.seek(max(file_size - 128, 0))
+        if f.read(3) == b"TAG":  # ID3v1 в конце файла
+            audio_size -= 128
+        duration = audio_size * 8 / frame.bitrate
+        bitrate = frame.bitrate
+    return AudioMetadata("mp3", duration, frame.sample_rate, frame.channels, bitrate)
+
+
+def extract_metadata(path: str) -> AudioMetadata:
+    """Определяет контейнер по сигнатуре (а не по Content-Type клиента) и читает его заголовки."""
+    file_size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        header = f.read(SNIFF_SIZE)
+        audio_format = sniff_format(header)
+        try:
+            if audio_format == "wav":
+                return _parse_wav(f, file_size)
+            if audio_format == "ogg":
+                return _parse_ogg(f, file_size)
+            offset = _id3v2_size(header)
+            if audio_format == "flac":
+                return _parse_flac(f, file_size, offset)
+            if audio_format == "mp3":
+                return _parse_mp3(f, file_size, offset)
+        except (struct.error, ValueError, ZeroDivisionError):
+            # Повреждённый заголовок: формат известен, подробностей нет
+            return AudioMetadata(audio_format)
+    return AudioMetadata()
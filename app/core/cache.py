@@ -0,0 +1,81 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from app.core import metrics
+from app.core.config import settings
+
+
+class TTLCache:
+    """Ограниченный LRU-кэш с временем жизни записей.
+
+    Рассчитан на работу из одного event loop, поэтому обходится без блокировок.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, track_stats: bool = True):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.track_stats = track_stats
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key)
+        if entry is not None:
+            value, expires_at = entry
+            if expires_at > time.monotonic():
+                self._data.move_to_end(key)
+                if self.track_stats:
+                    self.hits += 1
+                return value
+            del self._data[key]
+        if self.track_stats:
+            self.misses += 1
+        return default
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        if self.maxsize <= 0 or ttl <= 0:
+            return
+        self._data[key] = (value, time.monotonic() + ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def items(self) -> List[Tuple[Hashable, Any]]:
+        """Снимок неистёкших записей; статистику попаданий не трогает."""
+        now = time.monotonic()
+        return [(key, value) for key, (value, expires_at) in self._data.items() if expires_at > now]
+
+    def invalidate(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+# Снимки пользователей по id для get_current_user; сбрасываются в crud при изменении пользователя,
+# а изменения из других воркеров находит UserCacheSync (app.core.purge)
+user_cache = TTLCache(
+    maxsize=settings.USER_CACHE_SIZE,
+    ttl=settings.USER_CACHE_TTL_SECONDS,
+    track_stats=settings.USER_CACHE_STATS,
+)
+
+metrics.registry.gauge(
+    "user_cache", "Authenticated user cache state", metrics.cache_stats_callback(user_cache.stats), labelnames=("stat",)
+)
@@ -7,6 +7,7 @@ from typing import List, Optional, Union
 
 class Settings(BaseSettings):
     API_V1_STR: str = "/api/v1"
+    METRICS_ENABLED: bool = True
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
@@ -33,20 +34,79 @@ class Settings(BaseSettings):
             path=f"{values.data.get('POSTGRES_DB') or ''}",
         )
 
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_TIMEOUT: float = 10.0
+    DB_POOL_PRE_PING: bool = False
+    DB_POOL_PING_IDLE_SECONDS: float = 300.0
+    DB_STATEMENT_CACHE_SIZE: int = 100
+
     YANDEX_CLIENT_ID: str
     YANDEX_CLIENT_SECRET: str
     YANDEX_REDIRECT_URI: AnyHttpUrl
 
     FIRST_SUPERUSER_YANDEX_ID: str
 
+    YANDEX_AUTH_URL: str = "https://oauth.yandex.ru/authorize"
+    YANDEX_TOKEN_URL: str = "https://oauth.yandex.ru/token"
+    YANDEX_USERINFO_URL: str = "https://login.yandex.ru/info"
+    YANDEX_HTTP2: bool = False
+    YANDEX_CONNECT_TIMEOUT: float = 3.0
+    YANDEX_READ_TIMEOUT: float = 10.0
+    YANDEX_MAX_RETRIES: int = 2
+    YANDEX_RETRY_BACKOFF: float = 0.2
+    YANDEX_MAX_CONNECTIONS: int = 100
+    YANDEX_KEEPALIVE_EXPIRY: float = 30.0
+
     UPLOADS_DIR: str = "./uploads"
 
     @field_validator("UPLOADS_DIR", mode="after")
     @classmethod
-    def create_uploads_dir(cls, v: str) -> str:
-        path = Path(v)
-        path.mkdir(parents=True, exist_ok=True)
-        return str(path.resolve()) # Return absolute path
+    def resolve_uploads_dir(cls, v: str) -> str:
+        # Каталог создаётся при первой записи (app.core.storage), а не при импорте настроек
+        return str(Path(v).resolve()) # Return absolute path
+
+    STORAGE_BACKEND: str = "local" # local или s3
+    S3_BUCKET: Optional[str] = None
+    S3_PREFIX: str = ""
+    S3_ENDPOINT_URL: Optional[str] = None # Для MinIO и других S3-совместимых хранилищ
+    S3_REGION: Optional[str] = None
+    S3_ACCESS_KEY_ID: Optional[str] = None
+    S3_SECRET_ACCESS_KEY: Optional[str] = None
+    S3_MULTIPART_CHUNK_SIZE: int = 16 * 1024 * 1024
+    S3_MAX_CONCURRENCY: int = 8
+    S3_PRESIGNED_URL_TTL: int = 300
+
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024
+    MAX_UPLOAD_SIZE: int = 200 * 1024 * 1024
+    MAX_BATCH_FILES: int = 50
+    PROCESSING_WORKERS: int = 0 # Процессы для разбора аудио; 0 — по числу ядер
+    MAX_RESUMABLE_UPLOAD_SIZE: int = 4 * 1024 * 1024 * 1024
+    UPLOAD_SESSION_TTL_SECONDS: float = 24 * 60 * 60
+    UPLOAD_SESSION_GC_INTERVAL_SECONDS: float = 10 * 60
+    UPLOAD_COMPLETE_TIMEOUT_SECONDS: float = 30 * 60 # Через сколько прерванный complete (упал воркер) можно повторить
+    UPLOAD_MAX_CONCURRENT: int = 32 # 0 — без ограничения
+    UPLOAD_MAX_BYTES_IN_FLIGHT: int = 2 * 1024 * 1024 * 1024 # 0 — без ограничения
+    UPLOAD_RATE_PER_USER: float = 1.0 # Загрузок в секунду на пользователя; 0 — без ограничения
+    UPLOAD_BURST_PER_USER: int = 10
+    UPLOAD_RETRY_AFTER_SECONDS: int = 5
+    USER_STORAGE_QUOTA: Optional[int] = None # Байт на пользователя; None — без ограничения
+    USER_FILE_QUOTA: Optional[int] = None # Файлов на пользователя; None — без ограничения
+    BLOB_PURGE_BATCH_SIZE: int = 500
+    BLOB_PURGE_INTERVAL_SECONDS: float = 60.0
+    BLOB_RESERVATION_SECONDS: float = 60 * 60 # Дольше самого долгого размещения файла в хранилище
+
+    USER_CACHE_SIZE: int = 10000
+    USER_CACHE_TTL_SECONDS: float = 60.0
+    USER_CACHE_STATS: bool = True
+    USER_CACHE_SYNC_SECONDS: float = 5.0 # Как быстро изменение пользователя доходит до кэша других воркеров
+    TOKEN_CACHE_SIZE: int = 50000
+    TOKEN_REVOCATION_SYNC_SECONDS: float = 5.0 # Как быстро отзыв токена доходит до других воркеров
+
+    WEB_WORKERS: int = 0 # Процессы python -m app.server; 0 — по числу доступных ядер
+    WEB_GRACEFUL_TIMEOUT: int = 30 # Секунд на завершение начатых запросов при остановке и перезапуске
+    WEB_MAX_REQUESTS: Optional[int] = None # Плановый перезапуск воркера после стольких запросов
 
     class Config:
         env_file = ".env"
@@ -56,6 +116,6 @@ class Settings(BaseSettings):
 settings = Settings()
 
 # --- Yandex OAuth URLs ---
-YANDEX_AUTH_URL = "https://oauth.yandex.ru/authorize"
-YANDEX_TOKEN_URL = "https://oauth.yandex.ru/token"
-YANDEX_USERINFO_URL = "https://login.yandex.ru/info"
\ No newline at end of file
+YANDEX_AUTH_URL = settings.YANDEX_AUTH_URL
+YANDEX_TOKEN_URL = settings.YANDEX_TOKEN_URL
+YANDEX_USERINFO_URL = settings.YANDEX_USERINFO_URL
\ No newline at end of file
@@ -0,0 +1,104 @@
+import asyncio
+import os
+import random
+from typing import Optional
+
+import httpx
+
+from app.core.config import settings
+
+# Общий клиент для запросов к Yandex OAuth: keep-alive соединения переиспользуются между логинами.
+# Создаётся в lifespan приложения (отдельно в каждом рабочем процессе) и закрывается при остановке.
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _forget_client() -> None:
+    # Соединения клиента принадлежат родителю: после fork дочерний процесс создаёт свой клиент
+    global _client
+    _client = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_client)
+
+RETRYABLE_STATUSES = {429, 502, 503, 504}
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def create_client() -> httpx.AsyncClient:
+    http2 = settings.YANDEX_HTTP2 and _http2_available()
+    if settings.YANDEX_HTTP2 and not http2:
+        print("YANDEX_HTTP2 is enabled but the 'h2' package is not installed, using HTTP/1.1")
+    return httpx.AsyncClient(
+        http2=http2,
+        timeout=httpx.Timeout(
+            settings.YANDEX_READ_TIMEOUT,
+            connect=settings.YANDEX_CONNECT_TIMEOUT,
+        ),
+        limits=httpx.Limits(
+            max_connections=settings.YANDEX_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.YANDEX_MAX_CONNECTIONS,
+            keepalive_expiry=settings.YANDEX_KEEPALIVE_EXPIRY,
+        ),
+    )
+
+
+async def start_client() -> None:
+    global _client
+    if _client is None:
+        _client = create_client()
+
+
+async def close_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def get_client() -> httpx.AsyncClient:
+    # Скрипты и тесты могут работать без lifespan — тогда клиент создаётся при первом обращении
+    global _client
+    if _client is None:
+        _client = create_client()
+    return _client
+
+
+def _backoff(attempt: int) -> float:
+    # Full jitter: случайная пауза до экспоненциально растущего предела
+    return random.uniform(0, settings.YANDEX_RETRY_BACKOFF * 2 ** (attempt - 1))
+
+
+async def request(method: str, url: str, *, idempotent: Optional[bool] = None, **kwargs) -> httpx.Response:
+    """Запрос через общий клиент с ограниченным числом повторов.
+
+    Ошибки соединения повторяются для любого метода (запрос не ушёл на сервер),
+    таймауты чтения и 429/5xx — только для идемпотентных запросов: код авторизации
+    Yandex одноразовый, и повторный обмен после частично выполненного POST бесполезен.
+    """
+    if idempotent is None:
+        idempotent = method.upper() in ("GET", "HEAD")
+
+    attempt = 0
+    while True:
+        try:
+            response = await get_client().request(method, url, **kwargs)
+            if not idempotent or response.status_code not in RETRYABLE_STATUSES:
+                return response
+            if attempt >= settings.YANDEX_MAX_RETRIES:
+                return response
+        except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout):
+            if attempt >= settings.YANDEX_MAX_RETRIES:
+                raise
+        except (httpx.ReadTimeout, httpx.RemoteProtocolError):
+            if not idempotent or attempt >= settings.YANDEX_MAX_RETRIES:
+                raise
+        attempt += 1
+        await asyncio.sleep(_backoff(attempt))
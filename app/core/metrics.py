@@ -0,0 +1,217 @@
+import bisect
+import time
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+# Минимальная реализация метрик в текстовом формате Prometheus, без внешних зависимостей.
+# Все изменения идут из одного event loop (или из потоков пула под GIL), блокировки не нужны.
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+THROUGHPUT_BUCKETS = tuple(float(2 ** n) * 1024 * 1024 for n in range(-2, 11))  # 256 КБ/с … 1 ГБ/с
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        if not self.labelnames:
+            self._values[()] = 0.0
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in self._values.items()
+        ]
+
+
+class Gauge(_Metric):
+    """Значения берутся из колбэка в момент выдачи /metrics: так живые счётчики не надо дублировать."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 callback: Callable[[], Iterable[Tuple[Tuple[str, ...], float]]] = None):
+        super().__init__(name, documentation, labelnames)
+        self._callback = callback
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in self._callback()
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # Для каждого набора меток: счётчики по корзинам (без накопления), сумма, количество
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        entry = self._values.get(key)
+        if entry is None:
+            entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    def samples(self) -> List[str]:
+        lines = []
+        names = self.labelnames + ("le",)
+        for key, (counts, total, count) in self._values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(names, key + (_format_value(bound),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name: str, documentation: str, callback, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, callback))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            try:
+                samples = metric.samples()
+            except Exception as e:
+                print(f"Could not collect metric {metric.name}: {e}")
+                continue
+            lines.extend(metric.header())
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+HTTP_REQUESTS = registry.counter(
+    "http_requests_total", "HTTP requests by route and status code", ("method", "route", "status")
+)
+HTTP_LATENCY = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ("method", "route")
+)
+DB_QUERY_LATENCY = registry.histogram(
+    "db_query_duration_seconds", "Database statement execution time by statement type", ("statement",)
+)
+DB_POOL_CHECKOUTS = registry.counter("db_pool_checkouts_total", "Connections handed out by the pool")
+DB_POOL_WAIT = registry.counter(
+    "db_pool_wait_seconds_total", "Time spent waiting for a free pooled connection"
+)
+DB_POOL_TIMEOUTS = registry.counter("db_pool_timeouts_total", "Checkouts that gave up waiting for a connection")
+DB_POOL_LIVENESS_PINGS = registry.counter(
+    "db_pool_liveness_pings_total", "Idle connections checked with a ping before reuse"
+)
+DB_POOL_STALE_CONNECTIONS = registry.counter(
+    "db_pool_stale_connections_total", "Pooled connections found dead by the liveness ping"
+)
+UPLOAD_BYTES = registry.counter("upload_bytes_total", "Bytes received in audio uploads")
+UPLOAD_DURATION = registry.histogram(
+    "upload_duration_seconds", "Time spent receiving an uploaded file",
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0),
+)
+UPLOAD_THROUGHPUT = registry.histogram(
+    "upload_throughput_bytes_per_second", "Per-upload receive throughput", buckets=THROUGHPUT_BUCKETS
+)
+YANDEX_LATENCY = registry.histogram(
+    "yandex_oauth_request_duration_seconds", "Yandex OAuth call latency", ("operation", "outcome")
+)
+
+
+def cache_stats_callback(stats: Callable[[], dict]):
+    def collect():
+        current = stats()
+        return [((field,), current[field]) for field in ("size", "hits", "misses")]
+    return collect
+
+
+class MetricsMiddleware:
+    """ASGI-middleware: задержка и коды ответов по шаблону маршрута (а не по сырому пути)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # Маршрут становится известен после роутинга: Starlette дописывает его в тот же scope
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            HTTP_REQUESTS.inc(method=scope["method"], route=route, status=str(status_code))
+            HTTP_LATENCY.observe(time.perf_counter() - started, method=scope["method"], route=route)
@@ -0,0 +1,42 @@
+import base64
+import datetime
+import json
+from typing import Tuple
+
+# Границы типов столбцов: значения за ними asyncpg не передаст в запрос, и вместо 400 был бы 500
+MAX_ID = 2**31 - 1
+MAX_OFFSET = 2**63 - 1
+
+def encode_cursor(created_at: datetime.datetime, item_id: int) -> str:
+    raw = json.dumps([created_at.isoformat(), item_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime.datetime, int]:
+    """Raises ValueError for anything that was not produced by encode_cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, item_id = json.loads(raw)
+        created_at, item_id = datetime.datetime.fromisoformat(created_at), int(item_id)
+    except (TypeError, json.JSONDecodeError, UnicodeDecodeError, base64.binascii.Error) as e:
+        raise ValueError("Invalid cursor") from e
+    if not 0 < item_id <= MAX_ID or created_at.tzinfo is None:
+        raise ValueError("Invalid cursor")
+    return created_at, item_id
+
+
+def encode_offset_cursor(offset: int) -> str:
+    raw = json.dumps({"offset": offset}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_offset_cursor(cursor: str) -> int:
+    """Raises ValueError for anything that was not produced by encode_offset_cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        offset = int(json.loads(raw)["offset"])
+    except (TypeError, KeyError, json.JSONDecodeError, UnicodeDecodeError, base64.binascii.Error) as e:
+        raise ValueError("Invalid cursor") from e
+    if not 0 <= offset <= MAX_OFFSET:
+        raise ValueError("Invalid cursor")
+    return offset
@@ -0,0 +1,185 @@
+import os
+import struct
+from typing import Optional, Tuple
+
+# Предрасчитанные пики формы волны: для каждого уровня детализации — пары (min, max) int8
+# на корзину из samples_per_bucket отсчётов (все каналы сведены). Вычисление идёт в пуле
+# процессов (app.core.processing), поэтому модуль не импортирует ничего из приложения.
+# numpy нужен только для вычисления и импортируется там же: веб-процессу он не нужен вовсе.
+#
+# Формат файла (little-endian):
+#   заголовок  "PEAK", version u8, bits u8, level_count u16, sample_rate u32, frames u64
+#   уровни     level_count раз: samples_per_bucket u32, bucket_count u32
+#   данные     уровни подряд, bucket_count * 2 байт int8 (min, max, min, max, ...)
+
+MAGIC = b"PEAK"
+VERSION = 1
+HEADER = struct.Struct("<4sBBHIQ")
+LEVEL = struct.Struct("<II")
+
+BASE_SAMPLES_PER_BUCKET = 256
+LEVEL_FACTOR = 4
+LEVEL_COUNT = 4  # 256, 1024, 4096, 16384 отсчётов на корзину
+BLOCK_FRAMES = BASE_SAMPLES_PER_BUCKET * 4096  # сколько кадров за раз поднимается из memmap
+
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_IEEE_FLOAT = 3
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+def _read_wav_layout(path: str) -> Optional[Tuple[int, int, int, int, int, int]]:
+    """(format_tag, channels, sample_rate, bits, data_offset, data_size) или None, если это не PCM WAV."""
+    file_size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        riff = f.read(12)
+        if len(riff) < 12 or riff[:4] != b"RIFF" or riff[8:12] != b"WAVE":
+            return None
+        fmt = None
+        while True:
+            chunk_header = f.read(8)
+            if len(chunk_header) < 8:
+                return None
+            chunk_id, chunk_size = struct.unpack("<4sI", chunk_header)
+            if chunk_id == b"fmt ":
+                data = f.read(chunk_size)
+                if len(data) < 16:
+                    return None
+                format_tag, channels, sample_rate, _, _, bits = struct.unpack("<HHIIHH", data[:16])
+                if format_tag == WAVE_FORMAT_EXTENSIBLE and len(data) >= 26:
+                    format_tag = struct.unpack("<H", data[24:26])[0]  # первые байты GUID подформата
+                fmt = (format_tag, channels, sample_rate, bits)
+                f.seek(chunk_size % 2, os.SEEK_CUR)
+            elif chunk_id == b"data":
+                if fmt is None:
+                    return None
+                offset = f.tell()
+                size = file_size - offset if chunk_size == 0xFFFFFFFF else min(chunk_size, file_size - offset)
+                return fmt + (offset, size)
+            else:
+                f.seek(chunk_size + chunk_size % 2, os.SEEK_CUR)
+
+
+def _sample_reader(path: str, format_tag: int, channels: int, bits: int, offset: int, frames: int):
+    """Возвращает (функция чтения блока кадров как float32 в [-1, 1], исходный memmap)."""
+    import numpy as np
+
+    if format_tag == WAVE_FORMAT_IEEE_FLOAT and bits in (32, 64):
+        mm = np.memmap(path, dtype=f"<f{bits // 8}", mode="r", offset=offset, shape=(frames, channels))
+        return (lambda block: np.asarray(block, dtype=np.float32)), mm
+    if format_tag != WAVE_FORMAT_PCM:
+        return None, None
+    if bits == 8:
+        mm = np.memmap(path, dtype=np.uint8, mode="r", offset=offset, shape=(frames, channels))
+        return (lambda block: (block.astype(np.float32) - 128.0) / 128.0), mm
+    if bits in (16, 32):
+        mm = np.memmap(path, dtype=f"<i{bits // 8}", mode="r", offset=offset, shape=(frames, channels))
+        scale = float(2 ** (bits - 1))
+        return (lambda block: block.astype(np.float32) / scale), mm
+    if bits == 24:
+        mm = np.memmap(path, dtype=np.uint8, mode="r", offset=offset, shape=(frames, channels, 3))
+
+        def convert(block):
+            raw = block.astype(np.int32)
+            value = raw[..., 0] | (raw[..., 1] << 8) | (raw[..., 2] << 16)
+            value = (value << 8) >> 8  # знаковое расширение 24 -> 32 бит
+            return value.astype(np.float32) / float(2 ** 23)
+        return convert, mm
+    return None, None
+
+
+def _finest_level(read, mm, frames: int) -> Tuple["np.ndarray", "np.ndarray"]:
+    import numpy as np
+
+    spb = BASE_SAMPLES_PER_BUCKET
+    mins = []
+    maxs = []
+    for start in range(0, frames, BLOCK_FRAMES):
+        block = read(mm[start:min(start + BLOCK_FRAMES, frames)])
+        block = block.reshape(len(block), -1)  # (кадры, каналы)
+        full = len(block) // spb * spb
+        if full:
+            shaped = block[:full].reshape(-1, spb * block.shape[1])
+            mins.append(shaped.min(axis=1))
+            maxs.append(shaped.max(axis=1))
+        if full < len(block):  # неполная корзина бывает только в самом конце файла
+            mins.append(block[full:].min(keepdims=True).reshape(1))
+            maxs.append(block[full:].max(keepdims=True).reshape(1))
+    if not mins:
+        return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.float32)
+    return np.concatenate(mins), np.concatenate(maxs)
+
+
+def _coarser(values: "np.ndarray", reduce) -> "np.ndarray":
+    import numpy as np
+
+    pad = -len(values) % LEVEL_FACTOR
+    if pad:
+        values = np.concatenate([values, np.repeat(values[-1:], pad)])
+    return reduce(values.reshape(-1, LEVEL_FACTOR), axis=1)
+
+
+def _quantize(mins: "np.ndarray", maxs: "np.ndarray") -> "np.ndarray":
+    import numpy as np
+
+    # NaN и бесконечности во float WAV иначе дают неопределённый результат при приведении к int8
+    mins = np.nan_to_num(mins, nan=0.0, posinf=1.0, neginf=-1.0)
+    maxs = np.nan_to_num(maxs, nan=0.0, posinf=1.0, neginf=-1.0)
+    pairs = np.empty(len(mins) * 2, dtype=np.int8)
+    pairs[0::2] = np.clip(np.floor(mins * 127.0), -127, 127)
+    pairs[1::2] = np.clip(np.ceil(maxs * 127.0), -127, 127)
+    return pairs
+
+
+def compute_peaks(src_path: str, dest_path: str) -> bool:
+    """Считает пики для PCM/float WAV; False, если формат не поддерживается."""
+    import numpy as np
+
+    layout = _read_wav_layout(src_path)
+    if layout is None:
+        return False
+    format_tag, channels, sample_rate, bits, offset, data_size = layout
+    if not channels or not bits or bits % 8:
+        return False
+    frames = data_size // (channels * bits // 8)
+    read, mm = _sample_reader(src_path, format_tag, channels, bits, offset, frames) if frames else (None, None)
+    if frames and read is None:
+        return False
+
+    mins, maxs = _finest_level(read, mm, frames) if frames else (np.zeros(0), np.zeros(0))
+    levels = []
+    spb = BASE_SAMPLES_PER_BUCKET
+    for level in range(LEVEL_COUNT):
+        if level:
+            mins, maxs = _coarser(mins, np.min), _coarser(maxs, np.max)
+            spb *= LEVEL_FACTOR
+        levels.append((spb, _quantize(mins, maxs)))
+
+    tmp_path = f"{dest_path}.{os.getpid()}.tmp"  # несколько воркеров могут считать один блоб одновременно
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, 8, len(levels), sample_rate, frames))
+        for spb, pairs in levels:
+            f.write(LEVEL.pack(spb, len(pairs) // 2))
+        for _, pairs in levels:
+            f.write(pairs.tobytes())
+    os.replace(tmp_path, dest_path)
+    return True
+
+
+def read_level(path: str, level: int) -> Optional[Tuple[int, int, bytes]]:
+    """(samples_per_bucket, sample_rate, пары int8) для уровня; None, если такого уровня нет.
+
+    С диска читаются только заголовок, таблица уровней и нужный срез.
+    """
+    with open(path, "rb") as f:
+        _, version, _, level_count, sample_rate, _ = HEADER.unpack(f.read(HEADER.size))
+        if version != VERSION or not 0 <= level < level_count:
+            return None
+        table = f.read(LEVEL.size * level_count)
+        offset = HEADER.size + len(table)
+        for index in range(level_count):
+            spb, buckets = LEVEL.unpack_from(table, index * LEVEL.size)
+            if index == level:
+                f.seek(offset)
+                return spb, sample_rate, f.read(buckets * 2)
+            offset += buckets * 2
+    return None
@@ -0,0 +1,105 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Callable, Dict, Optional, Set, TypeVar
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.core import peaks, storage
+from app.core.audio_meta import AudioMetadata, extract_metadata
+from app.core.config import settings
+
+# Пул процессов для CPU-тяжёлой обработки загруженных файлов: разбор выполняется на всех ядрах,
+# а event loop и GIL основного процесса остаются свободны для запросов.
+# spawn вместо fork: в момент создания пула в процессе уже работают потоки (пул run_in_threadpool).
+_executor: Optional[ProcessPoolExecutor] = None
+
+# Идущие расчёты пиков по digest: одновременные запросы к одному блобу ждут общий результат
+_peaks_tasks: Dict[str, asyncio.Future] = {}
+_background: Set[asyncio.Task] = set()
+
+T = TypeVar("T")
+
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.PROCESSING_WORKERS or os.cpu_count() or 1,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _executor
+
+
+def _forget_executor() -> None:
+    # Процессы пула — дети родителя: после fork дочерний процесс заводит свой пул
+    global _executor
+    _executor = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_executor)
+
+
+def shutdown_executor() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True, cancel_futures=True)
+        _executor = None
+
+
+async def run_in_process(func: Callable[..., T], *args) -> T:
+    try:
+        return await asyncio.get_running_loop().run_in_executor(get_executor(), func, *args)
+    except BrokenProcessPool:
+        # Дочерний процесс упал (например, OOM killer): пул больше не принимает задачи, пересоздаём
+        global _executor
+        _executor = None
+        raise
+
+
+async def probe_audio(path: Path) -> AudioMetadata:
+    try:
+        return await run_in_process(extract_metadata, str(path))
+    except (OSError, BrokenProcessPool) as e:
+        print(f"Could not read audio metadata from {path}: {e}")
+        return AudioMetadata()
+
+
+async def _compute_peaks(digest: str, key: str, dest: Path) -> bool:
+    await run_in_threadpool(dest.parent.mkdir, parents=True, exist_ok=True)
+    async with storage.get_backend().materialize(key) as src:
+        return await run_in_process(peaks.compute_peaks, str(src), str(dest))
+
+
+async def ensure_peaks(digest: str, key: str) -> Optional[Path]:
+    """Путь к файлу пиков блоба (посчитав его при необходимости); None, если формат не поддерживается."""
+    path = storage.peaks_path(digest)
+    if await run_in_threadpool(path.exists):
+        return path
+
+    task = _peaks_tasks.get(digest)
+    if task is None:
+        # Задача регистрируется без await между get и записью: иначе параллельный запрос запустит второй расчёт
+        task = asyncio.ensure_future(_compute_peaks(digest, key, path))
+        _peaks_tasks[digest] = task
+        task.add_done_callback(lambda _: _peaks_tasks.pop(digest, None))
+    # shield: отмена одного запроса не должна прерывать расчёт, которого ждут другие
+    return path if await asyncio.shield(task) else None
+
+
+async def _precompute_peaks(digest: str, key: str) -> None:
+    try:
+        await ensure_peaks(digest, key)
+    except Exception as e:
+        print(f"Could not compute waveform peaks for blob {digest}: {e}")
+
+
+def schedule_peaks(digest: str, key: str) -> None:
+    """Считает пики в фоне сразу после загрузки, чтобы первый просмотр не ждал расчёта."""
+    task = asyncio.create_task(_precompute_peaks(digest, key))
+    _background.add(task)
+    task.add_done_callback(_background.discard)
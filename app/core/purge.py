@@ -0,0 +1,159 @@
+import asyncio
+import datetime
+from typing import Optional
+
+from app.core import security, storage
+from app.core.cache import user_cache
+from app.core.config import settings
+from app.db import crud
+from app.db.session import AsyncSessionLocal
+
+
+class BackgroundWorker:
+    """Периодическая фоновая задача в event loop приложения; notify() будит её раньше срока."""
+
+    name = "Background task"
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def notify(self) -> None:
+        self._wakeup.set()
+
+    async def run_once(self) -> None:
+        raise NotImplementedError
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                print(f"{self.name} failed: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+
+class BlobPurger(BackgroundWorker):
+    """Фоновое удаление блобов, на которые больше никто не ссылается.
+
+    Очередью служат сами строки audio_blobs с ref_count <= 0, поэтому после падения
+    процесса работа продолжается с того же места, а запросу удаления пользователя
+    не нужно ждать, пока с диска уйдут его файлы.
+    """
+
+    name = "Blob purge"
+
+    def __init__(self, batch_size: int, interval: float):
+        super().__init__(interval)
+        self.batch_size = batch_size
+
+    async def purge_batch(self) -> int:
+        async with AsyncSessionLocal() as db:
+            return await crud.purge_unreferenced_blobs(db, limit=self.batch_size)
+
+    async def run_once(self) -> None:
+        while await self.purge_batch() == self.batch_size:
+            pass
+
+
+class UploadSessionCollector(BackgroundWorker):
+    """Удаляет докачиваемые загрузки, в которые давно ничего не присылали, и их временные файлы."""
+
+    name = "Upload session cleanup"
+
+    def __init__(self, ttl: float, interval: float):
+        super().__init__(interval)
+        self.ttl = ttl
+
+    async def run_once(self) -> None:
+        older_than = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=self.ttl)
+        async with AsyncSessionLocal() as db:
+            upload_ids = await crud.delete_stale_upload_sessions(db, older_than=older_than)
+        await storage.remove_files([storage.upload_session_path(upload_id) for upload_id in upload_ids])
+        # Заодно подбираем файлы без строки в БД (процесс упал между записью файла и коммитом)
+        await storage.remove_stale_incoming(self.ttl)
+        if upload_ids:
+            print(f"Removed {len(upload_ids)} stale upload sessions")
+
+
+class RevocationSync(BackgroundWorker):
+    """Подтягивает в security.revoked_tokens отзывы, сделанные другими воркерами, и чистит истёкшие."""
+
+    name = "Token revocation sync"
+
+    # created_at — время начала транзакции, и строка может стать видна позже соседних:
+    # каждый раз перечитываем небольшое окно до последней прочитанной строки
+    OVERLAP = datetime.timedelta(seconds=60)
+    CLEANUP_EVERY = 100  # запусков между удалениями истёкших строк
+
+    def __init__(self, interval: float):
+        super().__init__(interval)
+        self._runs = 0
+
+    async def run_once(self) -> None:
+        revoked = security.revoked_tokens
+        created_after = revoked.synced_until - self.OVERLAP if revoked.synced_until else None
+        async with AsyncSessionLocal() as db:
+            rows = await crud.get_revoked_tokens(db, created_after=created_after)
+            if self._runs % self.CLEANUP_EVERY == 0:
+                await crud.delete_expired_revocations(db)
+        self._runs += 1
+
+        for token_id, expires_at, created_at in rows:
+            revoked.add(token_id, expires_at)
+            if revoked.synced_until is None or created_at > revoked.synced_until:
+                revoked.synced_until = created_at
+        revoked.prune()
+
+
+class UserCacheSync(BackgroundWorker):
+    """Сбрасывает в user_cache снимки пользователей, которых другой воркер изменил или удалил.
+
+    crud сбрасывает кэш только в своём процессе. Здесь одним запросом по первичному ключу
+    сверяется updated_at закэшированных пользователей; нет строки или она новее снимка — снимок удаляется.
+    """
+
+    name = "User cache sync"
+
+    async def run_once(self) -> None:
+        snapshots = user_cache.items()
+        if not snapshots:
+            return
+        async with AsyncSessionLocal() as db:
+            versions = await crud.get_user_versions(db, [user_id for user_id, _ in snapshots])
+        for user_id, snapshot in snapshots:
+            if versions.get(user_id) != snapshot["updated_at"]:
+                user_cache.invalidate(user_id)
+
+
+blob_purger = BlobPurger(
+    batch_size=settings.BLOB_PURGE_BATCH_SIZE,
+    interval=settings.BLOB_PURGE_INTERVAL_SECONDS,
+)
+
+upload_session_collector = UploadSessionCollector(
+    ttl=settings.UPLOAD_SESSION_TTL_SECONDS,
+    interval=settings.UPLOAD_SESSION_GC_INTERVAL_SECONDS,
+)
+
+revocation_sync = RevocationSync(interval=settings.TOKEN_REVOCATION_SYNC_SECONDS)
+
+user_cache_sync = UserCacheSync(interval=settings.USER_CACHE_SYNC_SECONDS)
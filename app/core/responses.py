@@ -0,0 +1,9 @@
+import orjson
+from fastapi.responses import ORJSONResponse
+
+
+class FastJSONResponse(ORJSONResponse):
+    """orjson-ответ, в котором даты в UTC выглядят так же, как у Pydantic ("...Z")."""
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
@@ -0,0 +1,123 @@
+import contextlib
+import uuid
+from pathlib import Path
+from typing import AsyncIterator, List, Optional
+from urllib.parse import quote
+
+from fastapi.concurrency import run_in_threadpool
+
+try:
+    import boto3
+    from boto3.s3.transfer import TransferConfig
+    from botocore.config import Config
+    from botocore.exceptions import ClientError
+except ImportError:  # boto3 — необязательная зависимость, нужна только при STORAGE_BACKEND=s3
+    boto3 = None
+
+from app.core import storage
+from app.core.config import settings
+
+# Объектное хранилище с S3 API (AWS S3, MinIO, Yandex Object Storage и т.п.).
+# Ключи объектов — те же "ab/cd/<digest>", что и у локального бэкенда, с необязательным префиксом.
+
+
+class S3Storage(storage.StorageBackend):
+    def __init__(self):
+        if boto3 is None:
+            raise RuntimeError("STORAGE_BACKEND=s3 requires the 'boto3' package")
+        if not settings.S3_BUCKET:
+            raise RuntimeError("STORAGE_BACKEND=s3 requires S3_BUCKET")
+        self.bucket = settings.S3_BUCKET
+        self.prefix = settings.S3_PREFIX
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=settings.S3_ENDPOINT_URL,
+            region_name=settings.S3_REGION,
+            aws_access_key_id=settings.S3_ACCESS_KEY_ID,
+            aws_secret_access_key=settings.S3_SECRET_ACCESS_KEY,
+            config=Config(
+                max_pool_connections=settings.S3_MAX_CONCURRENCY * 4,
+                retries={"max_attempts": 3, "mode": "standard"},
+                # MinIO и другие локальные реализации обычно не умеют virtual-hosted адреса
+                s3={"addressing_style": "path" if settings.S3_ENDPOINT_URL else "auto"},
+            ),
+        )
+        # Файлы крупнее одной части загружаются multipart upload, части идут параллельно
+        self.transfer_config = TransferConfig(
+            multipart_threshold=settings.S3_MULTIPART_CHUNK_SIZE,
+            multipart_chunksize=settings.S3_MULTIPART_CHUNK_SIZE,
+            max_concurrency=settings.S3_MAX_CONCURRENCY,
+            use_threads=True,
+        )
+
+    def object_key(self, key: str) -> str:
+        return f"{self.prefix}{key}"
+
+    def _exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self.object_key(key))
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+        return True
+
+    def _upload(self, src: Path, key: str) -> None:
+        if self._exists(key):
+            return
+        self.client.upload_file(
+            str(src), self.bucket, self.object_key(key),
+            Config=self.transfer_config,
+        )
+
+    def _put(self, temp_path: Path, key: str) -> None:
+        self._upload(temp_path, key)
+        temp_path.unlink()
+
+    async def put(self, temp_path: Path, key: str) -> None:
+        await run_in_threadpool(self._put, temp_path, key)
+
+    async def copy_in(self, src: Path, key: str) -> None:
+        await run_in_threadpool(self._upload, src, key)
+
+    def _delete(self, keys: List[str]) -> None:
+        legacy = [storage.legacy_path(key) for key in keys if not storage.is_blob_key(key)]
+        for path in legacy:
+            path.unlink(missing_ok=True)
+        objects = [{"Key": self.object_key(key)} for key in keys if storage.is_blob_key(key)]
+        for start in range(0, len(objects), 1000):  # лимит DeleteObjects
+            self.client.delete_objects(
+                Bucket=self.bucket,
+                Delete={"Objects": objects[start:start + 1000], "Quiet": True},
+            )
+
+    async def delete(self, keys: List[str]) -> None:
+        await run_in_threadpool(self._delete, keys)
+
+    async def download_url(self, key: str, filename: str, media_type: str) -> Optional[str]:
+        return await run_in_threadpool(
+            self.client.generate_presigned_url,
+            "get_object",
+            Params={
+                "Bucket": self.bucket,
+                "Key": self.object_key(key),
+                "ResponseContentType": media_type,
+                "ResponseContentDisposition": f"inline; filename*=utf-8''{quote(filename)}",
+            },
+            ExpiresIn=settings.S3_PRESIGNED_URL_TTL,
+        )
+
+    @contextlib.asynccontextmanager
+    async def materialize(self, key: str) -> AsyncIterator[Path]:
+        if not storage.is_blob_key(key):
+            yield storage.legacy_path(key)
+            return
+        path = storage.incoming_dir() / f"{uuid.uuid4().hex}.download"
+        try:
+            await run_in_threadpool(
+                self.client.download_file, self.bucket, self.object_key(key), str(path),
+                Config=self.transfer_config,
+            )
+            yield path
+        finally:
+            await storage.remove_files([path])
@@ -1,10 +1,14 @@
+import hashlib
+import time
+import uuid
 import jwt
 from datetime import datetime, timedelta, timezone
 from typing import Optional, Dict, Any
-from passlib.context import CryptContext # Пока не используется для паролей, но может пригодиться
 from pydantic import ValidationError
 import httpx
 
+from app.core import http_client, metrics
+from app.core.cache import TTLCache
 from app.core.config import settings, YANDEX_AUTH_URL, YANDEX_TOKEN_URL, YANDEX_USERINFO_URL
 from app.schemas.token import TokenPayload
 
@@ -13,15 +17,34 @@ ACCESS_TOKEN_EXPIRE_MINUTES = settings.ACCESS_TOKEN_EXPIRE_MINUTES
 REFRESH_TOKEN_EXPIRE_DAYS = settings.REFRESH_TOKEN_EXPIRE_DAYS
 SECRET_KEY = settings.SECRET_KEY
 
-def create_access_token(subject: str) -> str:
+def new_session_id() -> str:
+    return uuid.uuid4().hex
+
+def session_expires_at() -> datetime:
+    # Дольше этого не проживёт ни один токен сессии: последний refresh выдан не позже, чем сейчас
+    return datetime.now(timezone.utc) + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+
+def create_access_token(subject: str, session_id: Optional[str] = None) -> str:
     expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode = {"exp": expire, "sub": str(subject), "type": "access"}
+    to_encode = {
+        "exp": expire,
+        "sub": str(subject),
+        "type": "access",
+        "jti": uuid.uuid4().hex,
+        "sid": session_id or new_session_id(),
+    }
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def create_refresh_token(subject: str) -> str:
+def create_refresh_token(subject: str, session_id: Optional[str] = None) -> str:
     expire = datetime.now(timezone.utc) + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
-    to_encode = {"exp": expire, "sub": str(subject), "type": "refresh"}
+    to_encode = {
+        "exp": expire,
+        "sub": str(subject),
+        "type": "refresh",
+        "jti": uuid.uuid4().hex,
+        "sid": session_id or new_session_id(),
+    }
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
@@ -50,6 +73,74 @@ def verify_token(token: str) -> Optional[TokenPayload]:
     except ValidationError as e:
          return None
 
+
+class TokenVerifier:
+    """Запоминает уже проверенные токены до их собственного exp.
+
+    Клиент присылает один и тот же access-токен тысячи раз за его жизнь, и повторная
+    проверка подписи, разбор payload и сборка TokenPayload на каждый запрос не нужны.
+    Ключ — SHA-256 токена, чтобы кэш не хранил сами токены.
+    """
+
+    def __init__(self, maxsize: int):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
+    def verify(self, token: str) -> Optional[TokenPayload]:
+        key = hashlib.sha256(token.encode()).digest()
+        token_data = self._cache.get(key)
+        if token_data is not None:
+            return token_data
+
+        token_data = verify_token(token)
+        if token_data is not None and token_data.exp is not None:
+            self._cache.set(key, token_data, ttl=token_data.exp - time.time())
+        return token_data
+
+    def stats(self) -> Dict[str, Any]:
+        return self._cache.stats()
+
+
+token_verifier = TokenVerifier(maxsize=settings.TOKEN_CACHE_SIZE)
+
+metrics.registry.gauge(
+    "token_cache", "Verified token cache state", metrics.cache_stats_callback(token_verifier.stats), labelnames=("stat",)
+)
+
+
+class RevocationList:
+    """Отозванные jti и sid в памяти процесса: проверка на каждый запрос без обращения к БД.
+
+    Источник истины — таблица revoked_tokens; отзывы этого процесса попадают сюда сразу,
+    отзывы других воркеров — при следующей синхронизации (app.core.purge.RevocationSync).
+    Запись живёт до exp отозванного токена, так что размер ограничен числом живых отзывов.
+    """
+
+    def __init__(self):
+        self._revoked: Dict[str, float] = {}  # id -> exp (unix time)
+        self.synced_until: Optional[datetime] = None  # created_at последней прочитанной строки
+
+    def __len__(self) -> int:
+        return len(self._revoked)
+
+    def __contains__(self, token_id: Optional[str]) -> bool:
+        return token_id in self._revoked
+
+    def add(self, token_id: str, expires_at: datetime) -> None:
+        self._revoked[token_id] = expires_at.timestamp()
+
+    def is_revoked(self, token_data: TokenPayload) -> bool:
+        return token_data.jti in self._revoked or token_data.sid in self._revoked
+
+    def prune(self) -> None:
+        now = time.time()
+        for token_id in [token_id for token_id, exp in self._revoked.items() if exp <= now]:
+            del self._revoked[token_id]
+
+
+revoked_tokens = RevocationList()
+
+metrics.registry.gauge("revoked_tokens", "Revoked token and session ids held in memory", lambda: [((), len(revoked_tokens))])
+
 # Yandex OAuth Functions
 
 def get_yandex_authorize_url() -> str:
@@ -68,35 +159,45 @@ async def exchange_yandex_code_for_token(code: str) -> Optional[str]:
         "client_id": settings.YANDEX_CLIENT_ID,
         "client_secret": settings.YANDEX_CLIENT_SECRET,
     }
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(YANDEX_TOKEN_URL, data=data)
-            response.raise_for_status()
-            token_data = response.json()
-            return token_data.get("access_token")
-        except httpx.HTTPStatusError as e:
-            print(f"Error exchanging Yandex code: {e.response.status_code} - {e.response.text}")
-            return None
-        except Exception as e:
-            print(f"An unexpected error occurred during Yandex token exchange: {e}")
-            return None
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        response = await http_client.request("POST", YANDEX_TOKEN_URL, data=data)
+        response.raise_for_status()
+        token_data = response.json()
+        outcome = "ok"
+        return token_data.get("access_token")
+    except httpx.HTTPStatusError as e:
+        outcome = str(e.response.status_code)
+        print(f"Error exchanging Yandex code: {e.response.status_code} - {e.response.text}")
+        return None
+    except Exception as e:
+        print(f"An unexpected error occurred during Yandex token exchange: {e}")
+        return None
+    finally:
+        metrics.YANDEX_LATENCY.observe(time.perf_counter() - started, operation="token", outcome=outcome)
 
 
 async def get_yandex_user_info(yandex_access_token: str) -> Optional[Dict[str, Any]]:
     headers = {"Authorization": f"OAuth {yandex_access_token}"}
     params = {"format": "json"}
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(YANDEX_USERINFO_URL, headers=headers, params=params)
-            response.raise_for_status()
-            user_info = response.json()
-            if "id" not in user_info:
-                print(f"Yandex user info response missing 'id': {user_info}")
-                return None
-            return user_info
-        except httpx.HTTPStatusError as e:
-            print(f"Error getting Yandex user info: {e.response.status_code} - {e.response.text}")
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        response = await http_client.request("GET", YANDEX_USERINFO_URL, headers=headers, params=params)
+        response.raise_for_status()
+        user_info = response.json()
+        if "id" not in user_info:
+            print(f"Yandex user info response missing 'id': {user_info}")
             return None
-        except Exception as e:
-            print(f"An unexpected error occurred during Yandex user info fetch: {e}")
-            return None
\ No newline at end of file
+        outcome = "ok"
+        return user_info
+    except httpx.HTTPStatusError as e:
+        outcome = str(e.response.status_code)
+        print(f"Error getting Yandex user info: {e.response.status_code} - {e.response.text}")
+        return None
+    except Exception as e:
+        print(f"An unexpected error occurred during Yandex user info fetch: {e}")
+        return None
+    finally:
+        metrics.YANDEX_LATENCY.observe(time.perf_counter() - started, operation="userinfo", outcome=outcome)
\ No newline at end of file
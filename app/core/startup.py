@@ -0,0 +1,41 @@
+import os
+import time
+from typing import Dict, Optional
+
+from app.core import metrics
+
+# Сколько стоит запуск процесса: импорт приложения, lifespan до готовности и (на Linux)
+# полное время с запуска интерпретатора. Новые реплики при автоскейлинге ждут именно его.
+
+phases: Dict[str, float] = {}
+
+
+def process_age() -> Optional[float]:
+    """Секунды с запуска процесса по /proc (Linux); None, если узнать нельзя."""
+    try:
+        with open("/proc/self/stat", "rb") as f:
+            stat = f.read()
+        with open("/proc/uptime", "rb") as f:
+            uptime = float(f.read().split()[0])
+        # Поле 22 (starttime, в тиках с загрузки системы); имя процесса в скобках может содержать пробелы
+        start_ticks = int(stat.rsplit(b")", 1)[1].split()[19])
+    except (OSError, ValueError, IndexError):
+        return None
+    return max(uptime - start_ticks / os.sysconf("SC_CLK_TCK"), 0.0)
+
+
+def mark_ready(lifespan_started: float) -> None:
+    phases["lifespan"] = time.perf_counter() - lifespan_started
+    age = process_age()
+    if age is not None:
+        phases["process"] = age
+    summary = ", ".join(f"{name} {value:.3f}s" for name, value in phases.items())
+    print(f"Ready to serve ({summary})")
+
+
+metrics.registry.gauge(
+    "app_startup_seconds",
+    "Process startup time by phase: app import, lifespan, total since process start",
+    lambda: [((name,), value) for name, value in phases.items()],
+    labelnames=("phase",),
+)
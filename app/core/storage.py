@@ -0,0 +1,215 @@
+import contextlib
+import hashlib
+import os
+import re
+import shutil
+import time
+from pathlib import Path
+from typing import AsyncIterator, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.core.config import settings
+
+# Контентно-адресуемое хранилище: каждый уникальный файл лежит один раз под своим SHA-256.
+# Ключ блоба (он же AudioBlob.filepath) — "ab/cd/<digest>": веерная раскладка по двум уровням
+# каталогов, чтобы ни в одном каталоге не копились миллионы записей. Ключи одинаковы для всех
+# бэкендов, поэтому переезд с диска в объектное хранилище не требует правки строк в БД.
+# Старые записи могут хранить путь к файлу плоского каталога (относительно CWD) — такие ключи
+# понимает каждый бэкенд, пока их не перенесёт app.scripts.migrate_storage.
+
+BLOB_KEY_RE = re.compile(r"^[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}$")
+
+
+def blob_key(digest: str) -> str:
+    return f"{digest[:2]}/{digest[2:4]}/{digest}"
+
+
+def is_blob_key(key: str) -> bool:
+    return BLOB_KEY_RE.match(key) is not None
+
+
+def legacy_path(key: str) -> Path:
+    return Path(key).resolve()
+
+
+class StorageBackend:
+    """Где лежат блобы. Временные файлы загрузок всегда живут на локальном диске (incoming_dir)."""
+
+    async def put(self, temp_path: Path, key: str) -> None:
+        """Переносит временный файл под ключ; если блоб уже есть — просто удаляет временный."""
+        raise NotImplementedError
+
+    async def copy_in(self, src: Path, key: str) -> None:
+        """Как put, но исходный файл остаётся на месте (для миграций)."""
+        raise NotImplementedError
+
+    async def delete(self, keys: List[str]) -> None:
+        raise NotImplementedError
+
+    def local_path(self, key: str) -> Optional[Path]:
+        """Путь на локальном диске, если блоб можно отдать как файл; иначе None."""
+        return legacy_path(key) if not is_blob_key(key) else None
+
+    async def download_url(self, key: str, filename: str, media_type: str) -> Optional[str]:
+        """Прямая ссылка на скачивание (например, presigned URL объектного хранилища)."""
+        return None
+
+    @contextlib.asynccontextmanager
+    async def materialize(self, key: str) -> AsyncIterator[Path]:
+        """Локальная копия блоба на время блока with (для обработки в пуле процессов)."""
+        path = self.local_path(key)
+        if path is None:
+            raise NotImplementedError
+        yield path
+
+
+def _place(temp_path: Path, dest: Path) -> None:
+    if dest.exists():
+        temp_path.unlink()
+    else:
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(temp_path, dest)
+
+
+def _link(src: Path, dest: Path) -> None:
+    # Жёсткая ссылка: старый путь остаётся рабочим, пока не закоммичен новый ключ
+    if dest.exists():
+        return
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        os.link(src, dest)
+    except FileExistsError:
+        pass
+    except OSError:
+        shutil.copy2(src, dest)
+
+
+def _remove_all(paths) -> None:
+    for path in paths:
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class LocalStorage(StorageBackend):
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def local_path(self, key: str) -> Path:
+        return self.root / key if is_blob_key(key) else legacy_path(key)
+
+    async def put(self, temp_path: Path, key: str) -> None:
+        await run_in_threadpool(_place, temp_path, self.local_path(key))
+
+    async def copy_in(self, src: Path, key: str) -> None:
+        await run_in_threadpool(_link, src, self.local_path(key))
+
+    async def delete(self, keys: List[str]) -> None:
+        await run_in_threadpool(_remove_all, [self.local_path(key) for key in keys])
+
+
+_backend: Optional[StorageBackend] = None
+
+
+def create_backend() -> StorageBackend:
+    if settings.STORAGE_BACKEND == "s3":
+        from app.core.s3_storage import S3Storage  # boto3 нужен только этому бэкенду
+        return S3Storage()
+    if settings.STORAGE_BACKEND != "local":
+        raise ValueError(f"Unknown STORAGE_BACKEND: {settings.STORAGE_BACKEND}")
+    return LocalStorage(settings.UPLOADS_DIR)
+
+
+def get_backend() -> StorageBackend:
+    global _backend
+    if _backend is None:
+        _backend = create_backend()
+    return _backend
+
+
+async def commit_blob(temp_path: Path, key: str) -> None:
+    await get_backend().put(temp_path, key)
+
+
+def peaks_path(digest: str) -> Path:
+    # Пики формы волны зависят только от содержимого; для локального бэкенда они лежат рядом
+    # с блобом, для объектного хранилища UPLOADS_DIR служит их локальным кэшем
+    return Path(settings.UPLOADS_DIR) / f"{blob_key(digest)}.peaks"
+
+
+async def remove_blobs(blobs: List[Tuple[str, str]]) -> None:
+    """Удаляет блобы по парам (digest, key) вместе с их пиками; повторное удаление безопасно."""
+    await get_backend().delete([key for _, key in blobs])
+    await run_in_threadpool(_remove_all, [peaks_path(digest) for digest, _ in blobs])
+
+
+# Локальные временные файлы загрузок
+
+def incoming_dir() -> Path:
+    path = Path(settings.UPLOADS_DIR) / ".incoming"
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def upload_session_path(upload_id: str) -> Path:
+    return incoming_dir() / f"{upload_id}.upload"
+
+
+def _allocate(path: Path, length: int) -> None:
+    # Разреженный файл нужного размера: части можно писать по любому смещению и в любом порядке
+    with open(path, "xb") as f:
+        f.truncate(length)
+
+
+async def allocate_file(path: Path, length: int) -> None:
+    await run_in_threadpool(_allocate, path, length)
+
+
+def hash_file(path: Path) -> Tuple[str, int]:
+    hasher = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as f:
+        while chunk := f.read(settings.UPLOAD_CHUNK_SIZE):
+            hasher.update(chunk)
+            size += len(chunk)
+    return hasher.hexdigest(), size
+
+
+def snapshot_file(src: Path, dest: Path) -> Tuple[str, int]:
+    """Копирует src в новый файл dest, считая sha256 скопированных байт.
+
+    Хэш и размер относятся именно к dest: если в src кто-то продолжает писать,
+    коммитится копия, а не файл, который ещё меняется.
+    """
+    hasher = hashlib.sha256()
+    size = 0
+    with open(src, "rb") as f, open(dest, "xb") as out:
+        while chunk := f.read(settings.UPLOAD_CHUNK_SIZE):
+            hasher.update(chunk)
+            out.write(chunk)
+            size += len(chunk)
+    return hasher.hexdigest(), size
+
+
+async def remove_files(paths) -> None:
+    await run_in_threadpool(_remove_all, list(paths))
+
+
+def _remove_stale_incoming(max_age: float) -> int:
+    # Временные файлы, оставшиеся после падения процесса между записью файла и коммитом
+    cutoff = time.time() - max_age
+    removed = 0
+    for entry in incoming_dir().iterdir():
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                entry.unlink()
+                removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+async def remove_stale_incoming(max_age: float) -> int:
+    return await run_in_threadpool(_remove_stale_incoming, max_age)
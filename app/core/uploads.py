@@ -0,0 +1,431 @@
+import asyncio
+import hashlib
+import os
+import time
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
+from starlette.requests import ClientDisconnect
+
+try:
+    import python_multipart as multipart
+    from python_multipart.exceptions import MultipartParseError
+    from python_multipart.multipart import parse_options_header
+except ModuleNotFoundError:
+    import multipart
+    from multipart.exceptions import MultipartParseError
+    from multipart.multipart import parse_options_header
+
+from app.core.config import settings
+
+MAX_FIELD_SIZE = 64 * 1024
+# Запас на заголовки частей и обычные поля формы сверх размера самих файлов
+MULTIPART_OVERHEAD = 1024 * 1024
+QUOTA_EXCEEDED = "Storage quota exceeded."
+
+
+@dataclass
+class ReceivedFile:
+    field_name: str
+    filename: Optional[str]
+    content_type: Optional[str]
+    path: Path
+    size: int = 0
+    elapsed: float = 0.0
+    digest: Optional[str] = None
+
+    @property
+    def bytes_per_sec(self) -> float:
+        return self.size / self.elapsed if self.elapsed > 0 else 0.0
+
+
+@dataclass
+class RejectedFile:
+    filename: Optional[str]
+    status_code: int
+    detail: str
+
+
+@dataclass
+class MultipartUpload:
+    fields: Dict[str, str] = field(default_factory=dict)
+    files: List[ReceivedFile] = field(default_factory=list)
+    rejected: List[RejectedFile] = field(default_factory=list)
+
+    async def discard(self) -> None:
+        for received in self.files:
+            await run_in_threadpool(_unlink, received.path)
+
+
+def _unlink(path: Path) -> None:
+    try:
+        path.unlink()
+    except FileNotFoundError:
+        pass
+
+
+class ChunkWriter:
+    """Пишет файл блоками фиксированного размера в пуле потоков, попутно считая SHA-256.
+
+    Запись очередного блока идёт параллельно с чтением следующего из сети,
+    event loop при этом не блокируется.
+    """
+
+    def __init__(self, path: Path, chunk_size: int = settings.UPLOAD_CHUNK_SIZE):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.size = 0
+        self._buffer = bytearray()
+        self._file = None
+        self._hasher = hashlib.sha256()
+        self._pending: Optional[asyncio.Future] = None
+
+    async def open(self) -> None:
+        self._file = await run_in_threadpool(open, self.path, "wb")
+
+    async def write(self, data: bytes) -> None:
+        self._buffer += data
+        self.size += len(data)
+        if len(self._buffer) >= self.chunk_size:
+            await self._flush()
+
+    async def _flush(self) -> None:
+        if self._pending is not None:
+            await self._pending
+            self._pending = None
+        if self._buffer:
+            chunk = bytes(self._buffer)
+            self._buffer.clear()
+            self._pending = asyncio.ensure_future(run_in_threadpool(self._write_chunk, chunk))
+
+    def _write_chunk(self, chunk: bytes) -> None:
+        # hashlib отпускает GIL на больших буферах, так что хеширование тоже уходит с event loop
+        self._hasher.update(chunk)
+        self._file.write(chunk)
+
+    @property
+    def digest(self) -> str:
+        return self._hasher.hexdigest()
+
+    async def close(self) -> None:
+        await self._flush()
+        if self._pending is not None:
+            await self._pending
+            self._pending = None
+        await run_in_threadpool(self._file.close)
+
+    async def abort(self) -> None:
+        if self._pending is not None:
+            try:
+                await self._pending
+            except Exception:
+                pass
+            self._pending = None
+        if self._file is not None:
+            await run_in_threadpool(self._file.close)
+        await run_in_threadpool(_unlink, self.path)
+
+
+class _PartCollector:
+    """Колбэки python-multipart: складывают события парсера в очередь для асинхронной стороны."""
+
+    def __init__(self):
+        self.events: List[Tuple] = []
+        self._headers: Dict[bytes, bytes] = {}
+        self._header_field = b""
+        self._header_value = b""
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+        }
+
+    def drain(self) -> List[Tuple]:
+        events, self.events = self.events, []
+        return events
+
+    def on_part_begin(self) -> None:
+        self._headers = {}
+
+    def on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_field += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def on_header_end(self) -> None:
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def on_headers_finished(self) -> None:
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        name = _decode(options.get(b"name", b""))
+        filename = _decode(options[b"filename"]) if b"filename" in options else None
+        content_type = _decode(self._headers[b"content-type"]) if b"content-type" in self._headers else None
+        self.events.append(("part", name, filename, content_type))
+
+    def on_part_data(self, data: bytes, start: int, end: int) -> None:
+        self.events.append(("data", data[start:end]))
+
+    def on_part_end(self) -> None:
+        self.events.append(("end",))
+
+
+def _decode(value: bytes) -> str:
+    try:
+        return value.decode("utf-8")
+    except UnicodeDecodeError:
+        return value.decode("latin-1")
+
+
+async def receive_multipart(
+    request: Request,
+    *,
+    dest_dir: Path,
+    max_file_size: int = settings.MAX_UPLOAD_SIZE,
+    max_files: int = 1,
+    content_type_prefix: str = "audio/",
+    skip_invalid: bool = False,
+    quota_bytes: Optional[int] = None,
+) -> MultipartUpload:
+    """Потоково разбирает multipart-тело запроса, сразу записывая файлы в dest_dir.
+
+    Тело не спулится Starlette целиком: файлы пишутся блоками по мере поступления,
+    а превышение max_file_size (или остатка квоты quota_bytes на все файлы вместе)
+    обрывает загрузку на первом лишнем блоке.
+    С skip_invalid неподходящий файл не валит весь запрос: он пропускается
+    и попадает в upload.rejected.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Expected a multipart/form-data request body.",
+        )
+
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit():
+        if int(content_length) > max_file_size * max_files + MULTIPART_OVERHEAD:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"File is too large. Maximum size is {max_file_size} bytes.",
+            )
+        if quota_bytes is not None and int(content_length) > quota_bytes + MULTIPART_OVERHEAD:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=QUOTA_EXCEEDED,
+            )
+
+    collector = _PartCollector()
+    parser = multipart.MultipartParser(boundary, collector.callbacks())
+    upload = MultipartUpload()
+
+    writer: Optional[ChunkWriter] = None
+    current: Optional[ReceivedFile] = None
+    field_name: Optional[str] = None
+    field_data = bytearray()
+    started = 0.0
+    stored = 0  # байт в уже принятых файлах
+
+    async def reject(filename: Optional[str], status_code: int, detail: str) -> None:
+        # Данные отклонённой части дальше просто пропускаются: writer и field_name пустые
+        nonlocal writer, current
+        if not skip_invalid:
+            raise HTTPException(status_code=status_code, detail=detail)
+        if writer is not None:
+            await writer.abort()
+        writer = None
+        current = None
+        upload.rejected.append(RejectedFile(filename, status_code, detail))
+
+    async def handle(event: Tuple) -> None:
+        nonlocal writer, current, field_name, field_data, started, stored
+        kind = event[0]
+        if kind == "part":
+            _, name, filename, part_content_type = event
+            if filename is None:
+                field_name = name
+                field_data = bytearray()
+                return
+            if len(upload.files) >= max_files:
+                await reject(filename, status.HTTP_400_BAD_REQUEST, f"Too many files. Maximum is {max_files}.")
+                return
+            if not part_content_type or not part_content_type.startswith(content_type_prefix):
+                await reject(filename, status.HTTP_400_BAD_REQUEST, "Invalid file type. Only audio files are allowed.")
+                return
+            current = ReceivedFile(
+                field_name=name,
+                filename=filename,
+                content_type=part_content_type,
+                path=dest_dir / f"{uuid.uuid4().hex}.part",
+            )
+            writer = ChunkWriter(current.path)
+            await writer.open()
+            started = time.perf_counter()
+        elif kind == "data":
+            data = event[1]
+            if writer is not None:
+                if writer.size + len(data) > max_file_size:
+                    await reject(
+                        current.filename,
+                        status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        f"File is too large. Maximum size is {max_file_size} bytes.",
+                    )
+                    return
+                if quota_bytes is not None and stored + writer.size + len(data) > quota_bytes:
+                    await reject(current.filename, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, QUOTA_EXCEEDED)
+                    return
+                await writer.write(data)
+            elif field_name is not None:
+                if len(field_data) + len(data) > MAX_FIELD_SIZE:
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail=f"Form field '{field_name}' is too large.",
+                    )
+                field_data += data
+        elif kind == "end":
+            if writer is not None:
+                await writer.close()
+                current.size = writer.size
+                current.digest = writer.digest
+                current.elapsed = time.perf_counter() - started
+                stored += current.size
+                upload.files.append(current)
+                writer = None
+                current = None
+            elif field_name is not None:
+                upload.fields[field_name] = _decode(bytes(field_data))
+                field_name = None
+
+    try:
+        async for chunk in request.stream():
+            if chunk:
+                parser.write(chunk)
+            for event in collector.drain():
+                await handle(event)
+        parser.finalize()
+        for event in collector.drain():
+            await handle(event)
+    except MultipartParseError:
+        await _cleanup(writer, upload)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Malformed multipart body.",
+        )
+    except (HTTPException, ClientDisconnect, asyncio.CancelledError, OSError):
+        await _cleanup(writer, upload)
+        raise
+
+    if writer is not None:
+        # Тело закончилось посреди части файла
+        await _cleanup(writer, upload)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Malformed multipart body.",
+        )
+
+    return upload
+
+
+async def _cleanup(writer: Optional[ChunkWriter], upload: MultipartUpload) -> None:
+    if writer is not None:
+        await writer.abort()
+    await upload.discard()
+
+
+# Докачиваемые загрузки: клиент создаёт сессию, затем присылает части по смещениям (в т.ч. параллельно)
+
+def merge_range(ranges: List[List[int]], start: int, end: int) -> List[List[int]]:
+    """Добавляет полуинтервал [start, end) к отсортированному списку непересекающихся диапазонов."""
+    merged = []
+    for current_start, current_end in ranges:
+        if current_end < start or current_start > end:
+            merged.append([current_start, current_end])
+        else:
+            start = min(start, current_start)
+            end = max(end, current_end)
+    merged.append([start, end])
+    merged.sort()
+    return merged
+
+
+def missing_ranges(ranges: List[List[int]], length: int) -> List[List[int]]:
+    missing = []
+    position = 0
+    for start, end in ranges:
+        if start > position:
+            missing.append([position, start])
+        position = max(position, end)
+    if position < length:
+        missing.append([position, length])
+    return missing
+
+
+def _pwrite_all(fd: int, data: bytes, offset: int) -> None:
+    view = memoryview(data)
+    while view:
+        written = os.pwrite(fd, view, offset)
+        view = view[written:]
+        offset += written
+
+
+async def receive_range(request: Request, path: Path, offset: int, max_length: int) -> int:
+    """Пишет тело запроса в файл начиная с offset, возвращает число записанных байт.
+
+    os.pwrite не трогает общую позицию файла, поэтому параллельные запросы с разными
+    смещениями не мешают друг другу. При обрыве соединения возвращается то, что успело
+    дойти: эти байты уже на месте, и клиенту не нужно присылать их повторно.
+    """
+    fd = await run_in_threadpool(os.open, path, os.O_WRONLY)
+    written = 0
+    buffer = bytearray()
+    pending: Optional[asyncio.Future] = None
+
+    async def flush() -> None:
+        nonlocal written, pending
+        if pending is not None:
+            await pending
+            pending = None
+        if buffer:
+            chunk = bytes(buffer)
+            buffer.clear()
+            pending = asyncio.ensure_future(run_in_threadpool(_pwrite_all, fd, chunk, offset + written))
+            written += len(chunk)
+
+    try:
+        try:
+            async for chunk in request.stream():
+                if written + len(buffer) + len(chunk) > max_length:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail="Chunk extends past the declared upload length.",
+                    )
+                buffer += chunk
+                if len(buffer) >= settings.UPLOAD_CHUNK_SIZE:
+                    await flush()
+        except ClientDisconnect:
+            pass
+        await flush()
+        if pending is not None:
+            await pending
+            pending = None
+    finally:
+        if pending is not None:
+            try:
+                await pending
+            except Exception:
+                pass
+        await run_in_threadpool(os.close, fd)
+    return written
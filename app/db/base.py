@@ -5,5 +5,7 @@ class Base(AsyncAttrs, DeclarativeBase):
     pass
 
 async def init_db(engine):
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
\ No newline at end of file
+    # DDL выполняется, только если версия схемы устарела (app.db.migrations);
+    # импорт здесь, потому что migrations подтягивает модели, а они импортируют этот модуль
+    from app.db.migrations import ensure_schema
+    await ensure_schema(engine)
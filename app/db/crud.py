@@ -1,12 +1,21 @@
+import asyncio
+import datetime
+from pathlib import Path
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import update as sqlalchemy_update
-from sqlalchemy.orm import selectinload
+from sqlalchemy import insert as sqlalchemy_insert, update as sqlalchemy_update, delete as sqlalchemy_delete, func, or_, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy import inspect as sqlalchemy_inspect
+from sqlalchemy.orm import selectinload, make_transient_to_detached
 
 from . import models
+from app.core import storage, uploads
+from app.core.audio_meta import AudioMetadata
+from app.core.cache import user_cache
+from app.core.config import settings
 from app.schemas import user as user_schemas
 from app.schemas import audio as audio_schemas
-from typing import List, Optional
+from typing import Dict, List, Optional, Sequence, Tuple
 
 # User CRUD
 
@@ -14,6 +23,33 @@ async def get_user(db: AsyncSession, user_id: int) -> Optional[models.User]:
     result = await db.execute(select(models.User).filter(models.User.id == user_id))
     return result.scalars().first()
 
+def _user_snapshot(user: models.User) -> dict:
+    return {attr.key: getattr(user, attr.key) for attr in sqlalchemy_inspect(models.User).column_attrs}
+
+async def get_user_cached(db: AsyncSession, user_id: int) -> Optional[models.User]:
+    snapshot = user_cache.get(user_id)
+    if snapshot is not None:
+        # Каждый запрос получает свой отсоединённый экземпляр: его можно снова привязать к сессии
+        user = models.User(**snapshot)
+        make_transient_to_detached(user)
+        return user
+
+    user = await get_user(db, user_id)
+    if user is not None:
+        user_cache.set(user_id, _user_snapshot(user))
+    return user
+
+async def get_user_versions(db: AsyncSession, user_ids: Sequence[int]) -> Dict[int, datetime.datetime]:
+    """id → updated_at для тех из user_ids, что ещё существуют (поиск по первичному ключу)."""
+    versions = {}
+    for start in range(0, len(user_ids), 5000):  # число параметров запроса ограничено
+        result = await db.execute(
+            select(models.User.id, models.User.updated_at)
+            .filter(models.User.id.in_(user_ids[start:start + 5000]))
+        )
+        versions.update(result.all())
+    return versions
+
 async def get_user_by_email(db: AsyncSession, email: str) -> Optional[models.User]:
     result = await db.execute(select(models.User).filter(models.User.email == email))
     return result.scalars().first()
@@ -22,74 +58,647 @@ async def get_user_by_yandex_id(db: AsyncSession, yandex_id: str) -> Optional[mo
     result = await db.execute(select(models.User).filter(models.User.yandex_id == yandex_id))
     return result.scalars().first()
 
+# Запись идёт через INSERT/UPDATE ... RETURNING: серверные значения (id, created_at, updated_at)
+# приходят в том же ответе, без отдельного refresh-SELECT после коммита
+
 async def create_user(db: AsyncSession, *, user_in: user_schemas.UserCreate) -> models.User:
-    db_user = models.User(
-        yandex_id=user_in.yandex_id,
-        email=user_in.email,
-        first_name=user_in.first_name,
-        last_name=user_in.last_name,
-        display_name=user_in.display_name,
-        is_superuser=user_in.is_superuser,
+    result = await db.execute(
+        sqlalchemy_insert(models.User)
+        .values(
+            yandex_id=user_in.yandex_id,
+            email=user_in.email,
+            first_name=user_in.first_name,
+            last_name=user_in.last_name,
+            display_name=user_in.display_name,
+            is_superuser=user_in.is_superuser,
+        )
+        .returning(models.User)
     )
-    db.add(db_user)
+    db_user = result.scalars().one()
     await db.commit()
-    await db.refresh(db_user)
     return db_user
 
-async def update_user(
-    db: AsyncSession, *, db_user: models.User, user_in: user_schemas.UserUpdate
-) -> models.User:
-    update_data = user_in.model_dump(exclude_unset=True) # Pydantic v2
-    for field, value in update_data.items():
-        setattr(db_user, field, value)
+async def upsert_user_from_yandex(db: AsyncSession, *, user_in: user_schemas.UserCreate) -> models.User:
+    # Один INSERT ... ON CONFLICT вместо SELECT + INSERT/UPDATE + refresh: профиль обновляется
+    # при каждом входе, а одновременные первые входы не упираются в уникальность yandex_id
+    insert_stmt = pg_insert(models.User).values(**user_in.model_dump())
+    result = await db.execute(
+        insert_stmt
+        .on_conflict_do_update(
+            index_elements=[models.User.yandex_id],
+            set_={
+                "email": insert_stmt.excluded.email,
+                "first_name": insert_stmt.excluded.first_name,
+                "last_name": insert_stmt.excluded.last_name,
+                "display_name": insert_stmt.excluded.display_name,
+                "is_superuser": insert_stmt.excluded.is_superuser,
+                "updated_at": func.now(),
+            },
+        )
+        .returning(models.User)
+        .execution_options(populate_existing=True)
+    )
+    user = result.scalars().one()
+    await db.commit()
+    user_cache.invalidate(user.id)
+    return user
 
-    db.add(db_user)
+async def _update_user_returning(db: AsyncSession, user_id: int, values: dict) -> Optional[models.User]:
+    result = await db.execute(
+        sqlalchemy_update(models.User)
+        .where(models.User.id == user_id)
+        .values(**values)
+        .returning(models.User)
+        .execution_options(synchronize_session=False, populate_existing=True)
+    )
+    user = result.scalars().first()
     await db.commit()
-    await db.refresh(db_user)
-    return db_user
+    user_cache.invalidate(user_id)
+    return user
+
+async def update_user(
+    db: AsyncSession, *, user_id: int, user_in: user_schemas.UserUpdate
+) -> Optional[models.User]:
+    update_data = user_in.model_dump(exclude_unset=True) # Pydantic v2
+    if not update_data:
+        return await get_user(db, user_id)
+    return await _update_user_returning(db, user_id, update_data)
 
 async def set_superuser_status(db: AsyncSession, user: models.User, is_superuser: bool) -> models.User:
     if user.is_superuser != is_superuser:
-        user.is_superuser = is_superuser
-        db.add(user)
-        await db.commit()
-        await db.refresh(user)
+        user = await _update_user_returning(db, user.id, {"is_superuser": is_superuser})
     return user
 
 
 async def delete_user(db: AsyncSession, user_id: int) -> Optional[models.User]:
-    user = await get_user(db, user_id)
-    if user:
-        await db.delete(user)
-        await db.commit()
+    # Файлы пользователя удаляет ON DELETE CASCADE в самой БД, без загрузки строк в память;
+    # освободившиеся блобы потом удаляет фоновый BlobPurger
+    # Строку пользователя блокируем первой, как и загрузка (charge_usage), иначе встречные блокировки дадут deadlock
+    await db.execute(select(models.User.id).filter(models.User.id == user_id).with_for_update())
+    await release_blobs(db, owner_id=user_id)
+    result = await db.execute(
+        sqlalchemy_delete(models.User)
+        .where(models.User.id == user_id)
+        .returning(models.User)
+        .execution_options(synchronize_session=False)
+    )
+    user = result.scalars().first()
+    if user is None:
+        await db.rollback()
+        return None
+    await db.commit()
+    user_cache.invalidate(user_id)
     return user
 
 
+# Учёт места. Счётчики в users меняет тот же UPDATE, что проверяет квоту: строка пользователя
+# заблокирована до коммита, поэтому параллельные загрузки не превысят квоту вместе, а проверка
+# стоит одного обращения по первичному ключу. Порядок блокировок везде: пользователь, затем блобы.
+
+async def charge_usage(db: AsyncSession, *, owner_id: int, size: int, count: int) -> bool:
+    """Добавляет size байт и count файлов; False, если это превысит квоту (ничего не меняется)."""
+    query = (
+        sqlalchemy_update(models.User)
+        .where(models.User.id == owner_id)
+        .values(
+            storage_bytes=models.User.storage_bytes + size,
+            file_count=models.User.file_count + count,
+            updated_at=models.User.updated_at, # это не правка профиля
+        )
+    )
+    # Освобождение места проходит всегда, даже если квоту успели уменьшить
+    if size > 0 and settings.USER_STORAGE_QUOTA is not None:
+        query = query.where(models.User.storage_bytes + size <= settings.USER_STORAGE_QUOTA)
+    if count > 0 and settings.USER_FILE_QUOTA is not None:
+        query = query.where(models.User.file_count + count <= settings.USER_FILE_QUOTA)
+    result = await db.execute(query.returning(models.User.id).execution_options(synchronize_session=False))
+    return result.scalar_one_or_none() is not None
+
+async def get_user_usage(db: AsyncSession, user_id: int) -> Optional[Tuple[int, int]]:
+    """(storage_bytes, file_count) прямо из БД, мимо кэша пользователей."""
+    result = await db.execute(
+        select(models.User.storage_bytes, models.User.file_count).filter(models.User.id == user_id)
+    )
+    row = result.first()
+    return tuple(row) if row is not None else None
+
+async def get_quota_left(db: AsyncSession, user_id: int) -> Tuple[Optional[int], Optional[int]]:
+    """Сколько байт и файлов ещё помещается в квоту; None — без ограничения.
+
+    Только для раннего отказа: окончательно квоту проверяет charge_usage.
+    """
+    if settings.USER_STORAGE_QUOTA is None and settings.USER_FILE_QUOTA is None:
+        return None, None
+    storage_bytes, file_count = await get_user_usage(db, user_id) or (0, 0)
+    bytes_left = None if settings.USER_STORAGE_QUOTA is None else max(settings.USER_STORAGE_QUOTA - storage_bytes, 0)
+    files_left = None if settings.USER_FILE_QUOTA is None else max(settings.USER_FILE_QUOTA - file_count, 0)
+    return bytes_left, files_left
+
+
+# AudioBlob CRUD
+
+async def acquire_blob(db: AsyncSession, *, digest: str, size: int) -> models.AudioBlob:
+    # INSERT ... ON CONFLICT держит блокировку строки блоба до коммита,
+    # поэтому параллельное удаление блоба не разойдётся с размещением файла
+    result = await db.execute(
+        pg_insert(models.AudioBlob)
+        .values(
+            digest=digest,
+            filepath=storage.blob_key(digest),
+            size=size,
+            ref_count=1,
+        )
+        .on_conflict_do_update(
+            index_elements=[models.AudioBlob.digest],
+            set_={"ref_count": models.AudioBlob.ref_count + 1},
+        )
+        .returning(models.AudioBlob)
+        .execution_options(populate_existing=True)
+    )
+    return result.scalars().one()
+
+async def reserve_blobs(db: AsyncSession, *, blobs: Dict[str, int]) -> Dict[str, str]:
+    """blobs — digest → size; возвращает digest → ключ в хранилище. Коммитит сразу.
+
+    Отметка reserved_at не даёт BlobPurger удалить блоб, пока его файл размещается вне транзакции;
+    если загрузка потом откатится, строка с ref_count = 0 останется в очереди удаления.
+    """
+    blob_insert = pg_insert(models.AudioBlob)
+    result = await db.execute(
+        blob_insert
+        .values([
+            {
+                "digest": digest,
+                "filepath": storage.blob_key(digest),
+                "size": size,
+                "ref_count": 0,
+                "reserved_at": func.now(),
+            }
+            for digest, size in sorted(blobs.items())
+        ])
+        .on_conflict_do_update(
+            index_elements=[models.AudioBlob.digest],
+            set_={"reserved_at": blob_insert.excluded.reserved_at},
+        )
+        .returning(models.AudioBlob.digest, models.AudioBlob.filepath)
+    )
+    keys = dict(result.all())
+    await db.commit()
+    return keys
+
+async def store_blobs(db: AsyncSession, files: List[Tuple[str, int, Path]]) -> None:
+    """Размещает файлы (digest, size, temp_path) в хранилище до транзакции, которая на них сошлётся.
+
+    Ключ — digest, так что запись идемпотентна. Перенос в S3 идёт без соединения из пула
+    и без блокировок строк пользователя и блоба. Резервирование — в отдельной короткой
+    транзакции: вызывающий может держать в db свои блокировки (например, строки сессии загрузки).
+    """
+    temp_paths: Dict[str, Path] = {}
+    duplicates = []
+    for digest, size, temp_path in files:
+        if digest in temp_paths:
+            duplicates.append(temp_path)
+        else:
+            temp_paths[digest] = temp_path
+    async with AsyncSession(db.bind, expire_on_commit=False) as reserve_db:
+        keys = await reserve_blobs(reserve_db, blobs={digest: size for digest, size, _ in files})
+    # Кладём под ключ из строки блоба: у ещё не перенесённых блобов это старый путь
+    await asyncio.gather(*(storage.commit_blob(temp_paths[digest], key) for digest, key in keys.items()))
+    await storage.remove_files(duplicates)
+
+async def release_blobs(db: AsyncSession, *, owner_id: int) -> None:
+    counts = (
+        select(models.AudioFile.blob_digest, func.count().label("n"))
+        .filter(models.AudioFile.owner_id == owner_id, models.AudioFile.blob_digest.is_not(None))
+        .group_by(models.AudioFile.blob_digest)
+        .subquery()
+    )
+    await db.execute(
+        sqlalchemy_update(models.AudioBlob)
+        .where(models.AudioBlob.digest == counts.c.blob_digest)
+        .values(ref_count=models.AudioBlob.ref_count - counts.c.n)
+        .execution_options(synchronize_session=False)
+    )
+
+async def purge_unreferenced_blobs(db: AsyncSession, *, limit: int) -> int:
+    # SKIP LOCKED: несколько воркеров разбирают очередь параллельно, а блоб, который
+    # сейчас захватывает новая загрузка, пропускается. Недавно зарезервированные блобы
+    # тоже пропускаются: их файл, возможно, ещё размещается (store_blobs)
+    reserved_before = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(
+        seconds=settings.BLOB_RESERVATION_SECONDS
+    )
+    still_referenced = (
+        select(models.AudioFile.id)
+        .filter(models.AudioFile.blob_digest == models.AudioBlob.digest)
+        .exists()
+    )
+    result = await db.execute(
+        select(models.AudioBlob.digest, models.AudioBlob.filepath)
+        .filter(
+            models.AudioBlob.ref_count <= 0,
+            or_(models.AudioBlob.reserved_at.is_(None), models.AudioBlob.reserved_at < reserved_before),
+            ~still_referenced,
+        )
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    rows = result.all()
+    if not rows:
+        await db.rollback()
+        return 0
+
+    # Файлы удаляем до коммита, пока строки блобов заблокированы; повторное удаление безопасно
+    await storage.remove_blobs([(row.digest, row.filepath) for row in rows])
+    await db.execute(
+        sqlalchemy_delete(models.AudioBlob)
+        .where(models.AudioBlob.digest.in_([row.digest for row in rows]))
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    return len(rows)
+
+
 # AudioFile CRUD
 
+async def _insert_audio_file(
+    db: AsyncSession,
+    *,
+    filename: str,
+    owner_id: int,
+    digest: str,
+    size: int,
+    metadata: Optional[AudioMetadata] = None,
+) -> Optional[models.AudioFile]:
+    """Файл уже размещён через store_blobs. None, если он не помещается в квоту; вызывающий откатывает транзакцию."""
+    if not await charge_usage(db, owner_id=owner_id, size=size, count=1):
+        return None
+    blob = await acquire_blob(db, digest=digest, size=size)
+    result = await db.execute(
+        sqlalchemy_insert(models.AudioFile)
+        .values(
+            filename=filename,
+            filepath=blob.filepath,
+            blob_digest=blob.digest,
+            owner_id=owner_id,
+            size=size,
+            **(metadata or AudioMetadata()).as_columns(),
+        )
+        .returning(models.AudioFile)
+    )
+    return result.scalars().one()
+
 async def create_audio_file(
-    db: AsyncSession, *, file_in: audio_schemas.AudioFileCreate, owner_id: int, server_filepath: str
-) -> models.AudioFile:
-    db_file = models.AudioFile(
+    db: AsyncSession,
+    *,
+    file_in: audio_schemas.AudioFileCreate,
+    owner_id: int,
+    digest: str,
+    size: int,
+    temp_path: Path,
+    metadata: Optional[AudioMetadata] = None,
+) -> Optional[models.AudioFile]:
+    """None, если файл не помещается в квоту пользователя."""
+    await store_blobs(db, [(digest, size, temp_path)])
+    db_file = await _insert_audio_file(
+        db,
         filename=file_in.filename,
-        filepath=server_filepath,
-        owner_id=owner_id
+        owner_id=owner_id,
+        digest=digest,
+        size=size,
+        metadata=metadata,
     )
-    db.add(db_file)
+    if db_file is None:
+        await db.rollback()
+        return None
     await db.commit()
-    await db.refresh(db_file)
+    user_cache.invalidate(owner_id)
     return db_file
 
-async def get_audio_files_by_owner(db: AsyncSession, owner_id: int, skip: int = 0, limit: int = 100) -> List[models.AudioFile]:
+async def create_audio_files_batch(
+    db: AsyncSession, *, owner_id: int, files: List[Tuple[str, str, int, Path, AudioMetadata]]
+) -> Optional[List[models.AudioFile]]:
+    """files — кортежи (filename, digest, size, temp_path, metadata); всё в одной транзакции, строки в том же порядке.
+
+    None, если пачка целиком не помещается в квоту пользователя.
+    """
+    await store_blobs(db, [(digest, size, temp_path) for _, digest, size, temp_path, _ in files])
+    if not await charge_usage(db, owner_id=owner_id, size=sum(f[2] for f in files), count=len(files)):
+        await db.rollback()
+        return None
+
+    counts = {}
+    for _, digest, size, _, _ in files:
+        _, count = counts.get(digest, (size, 0))
+        counts[digest] = (size, count + 1)
+
+    # Один upsert на все блобы пачки; порядок по digest, чтобы параллельные пачки
+    # блокировали строки в одинаковой последовательности и не ловили deadlock
+    blob_insert = pg_insert(models.AudioBlob)
+    result = await db.execute(
+        blob_insert
+        .values([
+            {
+                "digest": digest,
+                "filepath": storage.blob_key(digest),
+                "size": size,
+                "ref_count": count,
+            }
+            for digest, (size, count) in sorted(counts.items())
+        ])
+        .on_conflict_do_update(
+            index_elements=[models.AudioBlob.digest],
+            set_={"ref_count": models.AudioBlob.ref_count + blob_insert.excluded.ref_count},
+        )
+        .returning(models.AudioBlob.digest, models.AudioBlob.filepath)
+    )
+    filepaths = dict(result.all())
+
     result = await db.execute(
-        select(models.AudioFile)
+        sqlalchemy_insert(models.AudioFile).returning(models.AudioFile, sort_by_parameter_order=True),
+        [
+            {
+                "filename": filename,
+                "filepath": filepaths[digest],
+                "blob_digest": digest,
+                "owner_id": owner_id,
+                "size": size,
+                **metadata.as_columns(),
+            }
+            for filename, digest, size, _, metadata in files
+        ],
+    )
+    db_files = list(result.scalars().all())
+    await db.commit()
+    user_cache.invalidate(owner_id)
+    return db_files
+
+async def get_audio_file_rows_by_owner(
+    db: AsyncSession,
+    owner_id: int,
+    *,
+    columns: Sequence[str],
+    limit: int = 100,
+    after: Optional[Tuple[datetime.datetime, int]] = None,
+) -> List[dict]:
+    """Страница файлов пользователя в виде словарей только с нужными колонками.
+
+    Без ORM-объектов: ни identity map, ни отслеживания изменений, ни ленивых атрибутов.
+    """
+    query = (
+        select(*(getattr(models.AudioFile, column) for column in columns))
         .filter(models.AudioFile.owner_id == owner_id)
-        .offset(skip)
+    )
+    if after is not None:
+        # Сравнение кортежей идёт по индексу ix_audio_files_owner_created_id без OFFSET
+        query = query.filter(tuple_(models.AudioFile.created_at, models.AudioFile.id) < tuple_(*after))
+    result = await db.execute(
+        query
+        .order_by(models.AudioFile.created_at.desc(), models.AudioFile.id.desc())
         .limit(limit)
-        .order_by(models.AudioFile.created_at.desc())
     )
-    return result.scalars().all()
+    return [dict(row) for row in result.mappings()]
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+async def search_audio_file_rows(
+    db: AsyncSession,
+    owner_id: int,
+    *,
+    query: str,
+    columns: Sequence[str],
+    limit: int = 100,
+    offset: int = 0,
+) -> List[dict]:
+    """Файлы пользователя, в имени которых есть query (без учёта регистра), лучшие совпадения первыми.
+
+    Сначала имена, которые начинаются с query, затем по триграммному сходству (чем меньше в имени
+    лишнего, тем выше), затем новые. Кандидатов отбирает индекс ix_audio_files_owner_filename_trgm.
+    """
+    escaped = _escape_like(query)
+    filename = models.AudioFile.filename
+    result = await db.execute(
+        select(*(getattr(models.AudioFile, column) for column in columns))
+        .filter(
+            models.AudioFile.owner_id == owner_id,
+            filename.ilike(f"%{escaped}%", escape="\\"),
+        )
+        .order_by(
+            filename.ilike(f"{escaped}%", escape="\\").desc(),
+            func.similarity(filename, query).desc(),
+            models.AudioFile.created_at.desc(),
+            models.AudioFile.id.desc(),
+        )
+        .offset(offset)
+        .limit(limit)
+    )
+    return [dict(row) for row in result.mappings()]
 
 async def get_audio_file(db: AsyncSession, file_id: int) -> Optional[models.AudioFile]:
     result = await db.execute(select(models.AudioFile).filter(models.AudioFile.id == file_id))
     return result.scalars().first()
+
+async def delete_audio_file(db: AsyncSession, file_id: int) -> Optional[models.AudioFile]:
+    """Удаляет запись, возвращает место в счётчики владельца и отпускает блоб (его удалит BlobPurger)."""
+    result = await db.execute(
+        sqlalchemy_delete(models.AudioFile)
+        .where(models.AudioFile.id == file_id)
+        .returning(models.AudioFile)
+        .execution_options(synchronize_session=False)
+    )
+    db_file = result.scalars().first()
+    if db_file is None:
+        await db.rollback()
+        return None
+    await charge_usage(db, owner_id=db_file.owner_id, size=-(db_file.size or 0), count=-1)
+    if db_file.blob_digest is not None:
+        await db.execute(
+            sqlalchemy_update(models.AudioBlob)
+            .where(models.AudioBlob.digest == db_file.blob_digest)
+            .values(ref_count=models.AudioBlob.ref_count - 1)
+            .execution_options(synchronize_session=False)
+        )
+    await db.commit()
+    user_cache.invalidate(db_file.owner_id)
+    return db_file
+
+
+# UploadSession CRUD
+
+async def create_upload_session(
+    db: AsyncSession, *, upload_id: str, owner_id: int, session_in: audio_schemas.UploadSessionCreate
+) -> models.UploadSession:
+    result = await db.execute(
+        sqlalchemy_insert(models.UploadSession)
+        .values(
+            id=upload_id,
+            owner_id=owner_id,
+            filename=session_in.filename,
+            content_type=session_in.content_type,
+            length=session_in.length,
+            received=[],
+            received_bytes=0,
+        )
+        .returning(models.UploadSession)
+    )
+    upload_session = result.scalars().one()
+    await db.commit()
+    return upload_session
+
+async def get_upload_session(
+    db: AsyncSession, upload_id: str, *, owner_id: int, for_update: bool = False
+) -> Optional[models.UploadSession]:
+    query = select(models.UploadSession).filter(
+        models.UploadSession.id == upload_id, models.UploadSession.owner_id == owner_id
+    )
+    if for_update:
+        query = query.with_for_update()
+    result = await db.execute(query.execution_options(populate_existing=True))
+    return result.scalars().first()
+
+async def record_upload_range(
+    db: AsyncSession, *, upload_id: str, start: int, end: int
+) -> Optional[models.UploadSession]:
+    # Параллельные части одной сессии сливают диапазоны под блокировкой строки; сами данные
+    # к этому моменту уже записаны, так что блокировка держится лишь на время одного UPDATE
+    result = await db.execute(
+        select(models.UploadSession.received)
+        .filter(models.UploadSession.id == upload_id)
+        .with_for_update()
+    )
+    received = result.scalar_one_or_none()
+    if received is None:
+        await db.rollback()
+        return None
+
+    if end > start:
+        received = uploads.merge_range(received, start, end)
+    result = await db.execute(
+        sqlalchemy_update(models.UploadSession)
+        .where(models.UploadSession.id == upload_id)
+        .values(
+            received=received,
+            received_bytes=sum(range_end - range_start for range_start, range_end in received),
+            updated_at=func.now(),
+        )
+        .returning(models.UploadSession)
+        .execution_options(populate_existing=True, synchronize_session=False)
+    )
+    upload_session = result.scalars().one()
+    await db.commit()
+    return upload_session
+
+async def claim_upload_session(db: AsyncSession, *, upload_id: str) -> datetime.datetime:
+    """Отмечает начало complete и коммитит; возвращает отметку, по которой complete потом узнаёт свою заявку.
+
+    Вызывать с заблокированной строкой сессии. После коммита блокировка и соединение свободны
+    на всё время копирования и размещения файла.
+    """
+    result = await db.execute(
+        sqlalchemy_update(models.UploadSession)
+        .where(models.UploadSession.id == upload_id)
+        .values(completing_at=func.now(), updated_at=func.now())
+        .returning(models.UploadSession.completing_at)
+        .execution_options(synchronize_session=False)
+    )
+    claimed_at = result.scalar_one()
+    await db.commit()
+    return claimed_at
+
+async def release_upload_claim(db: AsyncSession, *, upload_id: str, claimed_at: datetime.datetime) -> None:
+    # Только свою заявку: после UPLOAD_COMPLETE_TIMEOUT_SECONDS её мог перехватить другой complete
+    await db.rollback()
+    await db.execute(
+        sqlalchemy_update(models.UploadSession)
+        .where(models.UploadSession.id == upload_id, models.UploadSession.completing_at == claimed_at)
+        .values(completing_at=None)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+
+async def finalize_upload_session(
+    db: AsyncSession,
+    *,
+    upload_session: models.UploadSession,
+    digest: str,
+    metadata: Optional[AudioMetadata] = None,
+) -> Optional[models.AudioFile]:
+    """Вызывать с заблокированной строкой сессии (get_upload_session(for_update=True)), файл уже размещён store_blobs.
+
+    None, если файл не помещается в квоту: сессия остаётся, завершение можно повторить.
+    """
+    await db.execute(
+        sqlalchemy_delete(models.UploadSession)
+        .where(models.UploadSession.id == upload_session.id)
+        .execution_options(synchronize_session=False)
+    )
+    db_file = await _insert_audio_file(
+        db,
+        filename=upload_session.filename,
+        owner_id=upload_session.owner_id,
+        digest=digest,
+        size=upload_session.length,
+        metadata=metadata,
+    )
+    if db_file is None:
+        await db.rollback()
+        return None
+    await db.commit()
+    user_cache.invalidate(upload_session.owner_id)
+    return db_file
+
+async def delete_upload_session(db: AsyncSession, upload_id: str, *, owner_id: int) -> bool:
+    result = await db.execute(
+        sqlalchemy_delete(models.UploadSession)
+        .where(models.UploadSession.id == upload_id, models.UploadSession.owner_id == owner_id)
+        .returning(models.UploadSession.id)
+    )
+    deleted = result.scalar_one_or_none() is not None
+    await db.commit()
+    return deleted
+
+async def delete_stale_upload_sessions(db: AsyncSession, *, older_than: datetime.datetime) -> List[str]:
+    result = await db.execute(
+        sqlalchemy_delete(models.UploadSession)
+        .where(models.UploadSession.updated_at < older_than)
+        .returning(models.UploadSession.id)
+    )
+    upload_ids = list(result.scalars().all())
+    await db.commit()
+    return upload_ids
+
+
+# RevokedToken CRUD
+
+async def revoke_token(db: AsyncSession, *, token_id: str, expires_at: datetime.datetime) -> bool:
+    """False, если id уже отозван: так обмен одного refresh-токена проходит ровно один раз."""
+    result = await db.execute(
+        pg_insert(models.RevokedToken)
+        .values(token_id=token_id, expires_at=expires_at)
+        .on_conflict_do_nothing(index_elements=[models.RevokedToken.token_id])
+        .returning(models.RevokedToken.token_id)
+    )
+    revoked = result.scalar_one_or_none() is not None
+    await db.commit()
+    return revoked
+
+async def get_revoked_tokens(
+    db: AsyncSession, *, created_after: Optional[datetime.datetime] = None
+) -> List[Tuple[str, datetime.datetime, datetime.datetime]]:
+    """(token_id, expires_at, created_at) ещё не истёкших отзывов, по индексу created_at."""
+    query = select(
+        models.RevokedToken.token_id, models.RevokedToken.expires_at, models.RevokedToken.created_at
+    ).filter(models.RevokedToken.expires_at > func.now())
+    if created_after is not None:
+        query = query.filter(models.RevokedToken.created_at > created_after)
+    result = await db.execute(query)
+    return [tuple(row) for row in result.all()]
+
+async def delete_expired_revocations(db: AsyncSession) -> int:
+    result = await db.execute(
+        sqlalchemy_delete(models.RevokedToken)
+        .where(models.RevokedToken.expires_at <= func.now())
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    return result.rowcount
@@ -0,0 +1,110 @@
+"""Версионирование схемы: номер версии лежит в таблице schema_version.
+
+При старте процесса ensure_schema сверяет номер и, если схема актуальна, не выполняет
+никакого DDL. Новая база создаётся create_all сразу в текущем виде; базе, созданной
+прежним кодом (без schema_version), доигрываются все шаги MIGRATIONS после её номера.
+Шаги идемпотентны (IF NOT EXISTS), поэтому проходят и базы, которые уже обновляли
+скрипты из app.scripts. Чтобы изменить схему, поправьте модели и добавьте шаг в конец MIGRATIONS.
+Расширения из EXTENSIONS создаются до create_all: на них опираются индексы моделей.
+"""
+import time
+from typing import List, Optional
+
+from sqlalchemy import delete, func, insert, inspect, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+from sqlalchemy.future import select
+
+from app.db import models
+from app.db.base import Base
+
+# pg_trgm и btree_gin входят в contrib и с PostgreSQL 13 доступны владельцу базы без суперпользователя
+EXTENSIONS: List[str] = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE EXTENSION IF NOT EXISTS btree_gin",
+]
+
+MIGRATIONS: List[List[str]] = [
+    # 1: всё, что появилось до версионирования: блобы с дедупликацией, каскадное удаление,
+    # keyset-пагинация, метаданные аудио, счётчики места (таблицы добавляет create_all)
+    [
+        "ALTER TABLE audio_files ADD COLUMN IF NOT EXISTS blob_digest VARCHAR(64) REFERENCES audio_blobs (digest)",
+        "CREATE INDEX IF NOT EXISTS ix_audio_files_blob_digest ON audio_files (blob_digest)",
+        "ALTER TABLE audio_files DROP CONSTRAINT IF EXISTS audio_files_filepath_key",
+        "ALTER TABLE audio_files DROP CONSTRAINT IF EXISTS audio_files_owner_id_fkey",
+        "ALTER TABLE audio_files ADD CONSTRAINT audio_files_owner_id_fkey "
+        "FOREIGN KEY (owner_id) REFERENCES users (id) ON DELETE CASCADE",
+        "CREATE INDEX IF NOT EXISTS ix_audio_files_owner_created_id ON audio_files (owner_id, created_at DESC, id DESC)",
+        "CREATE INDEX IF NOT EXISTS ix_audio_blobs_unreferenced ON audio_blobs (digest) WHERE ref_count <= 0",
+        "ALTER TABLE audio_files ADD COLUMN IF NOT EXISTS audio_format VARCHAR(8)",
+        "ALTER TABLE audio_files ADD COLUMN IF NOT EXISTS duration FLOAT",
+        "ALTER TABLE audio_files ADD COLUMN IF NOT EXISTS sample_rate INTEGER",
+        "ALTER TABLE audio_files ADD COLUMN IF NOT EXISTS channels INTEGER",
+        "ALTER TABLE audio_files ADD COLUMN IF NOT EXISTS bitrate INTEGER",
+        "ALTER TABLE audio_files ADD COLUMN IF NOT EXISTS size BIGINT",
+        "ALTER TABLE users ADD COLUMN IF NOT EXISTS storage_bytes BIGINT NOT NULL DEFAULT 0",
+        "ALTER TABLE users ADD COLUMN IF NOT EXISTS file_count INTEGER NOT NULL DEFAULT 0",
+    ],
+    # 2: поиск по имени файла (GET /audio/search)
+    [
+        "CREATE INDEX IF NOT EXISTS ix_audio_files_owner_filename_trgm "
+        "ON audio_files USING gin (owner_id, filename gin_trgm_ops)",
+    ],
+    # 3: файл блоба размещается до транзакции загрузки, резерв защищает его от BlobPurger
+    [
+        "ALTER TABLE audio_blobs ADD COLUMN IF NOT EXISTS reserved_at TIMESTAMP WITH TIME ZONE",
+    ],
+    # 4: complete докачиваемой загрузки не держит блокировку строки сессии, пока копирует и размещает файл
+    [
+        "ALTER TABLE upload_sessions ADD COLUMN IF NOT EXISTS completing_at TIMESTAMP WITH TIME ZONE",
+    ],
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+# Несколько реплик, стартующих одновременно, обновляют схему по очереди
+MIGRATION_LOCK_KEY = 0x617564696F  # "audio"
+
+
+async def _read_version(conn: AsyncConnection) -> Optional[int]:
+    """Номер версии; None, если таблицы schema_version ещё нет."""
+    exists = await conn.scalar(text("SELECT to_regclass('schema_version') IS NOT NULL"))
+    if not exists:
+        return None
+    return await conn.scalar(select(func.max(models.schema_version.c.version))) or 0
+
+
+def _has_tables(sync_conn) -> bool:
+    return inspect(sync_conn).has_table(models.User.__tablename__)
+
+
+async def ensure_schema(engine: AsyncEngine) -> bool:
+    """True, если схему пришлось создавать или обновлять."""
+    async with engine.connect() as conn:
+        version = await _read_version(conn)
+    if version is not None and version >= SCHEMA_VERSION:
+        if version > SCHEMA_VERSION:
+            # Во время выкатки старые реплики работают с уже обновлённой схемой
+            print(f"Database schema version {version} is newer than this code ({SCHEMA_VERSION})")
+        return False
+
+    started = time.perf_counter()
+    async with engine.begin() as conn:
+        await conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        version = await _read_version(conn)
+        if version is not None and version >= SCHEMA_VERSION:
+            return False  # пока ждали блокировку, схему обновила другая реплика
+
+        legacy = version is None and await conn.run_sync(_has_tables)
+        for statement in EXTENSIONS:
+            await conn.execute(text(statement))
+        await conn.run_sync(Base.metadata.create_all)
+        if version is not None or legacy:
+            for number, statements in enumerate(MIGRATIONS[version or 0:], start=(version or 0) + 1):
+                for statement in statements:
+                    await conn.execute(text(statement))
+                print(f"Applied schema migration {number}")
+
+        await conn.execute(delete(models.schema_version))
+        await conn.execute(insert(models.schema_version).values(version=SCHEMA_VERSION))
+    print(f"Database schema is at version {SCHEMA_VERSION} ({time.perf_counter() - started:.2f}s)")
+    return True
@@ -1,6 +1,6 @@
 import datetime
 from sqlalchemy import (
-    Column, Integer, String, Boolean, DateTime, ForeignKey
+    Column, Integer, BigInteger, String, Boolean, DateTime, Float, ForeignKey, Index, JSON, Table
 )
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 from sqlalchemy.sql import func
@@ -23,19 +23,115 @@ class User(Base):
     updated_at: Mapped[datetime.datetime] = mapped_column(
         DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
     )
+    # Занятое место и число файлов; меняются в одной транзакции с audio_files (crud.charge_usage)
+    storage_bytes: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0, server_default="0")
+    file_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+
+    audio_files: Mapped[List["AudioFile"]] = relationship(
+        "AudioFile", back_populates="owner", cascade="all, delete-orphan", passive_deletes=True
+    )
 
-    audio_files: Mapped[List["AudioFile"]] = relationship("AudioFile", back_populates="owner", cascade="all, delete-orphan")
 
+class AudioBlob(Base):
+    __tablename__ = "audio_blobs"
+
+    digest: Mapped[str] = mapped_column(String(64), primary_key=True) # SHA-256 содержимого
+    filepath: Mapped[str] = mapped_column(String, nullable=False, unique=True) # Путь на сервере
+    size: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    ref_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0) # Сколько AudioFile ссылается на блоб
+    # Когда файл блоба последний раз размещали; BlobPurger не трогает блоб BLOB_RESERVATION_SECONDS после этого
+    reserved_at: Mapped[Optional[datetime.datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    created_at: Mapped[datetime.datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
 
 class AudioFile(Base):
     __tablename__ = "audio_files"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     filename: Mapped[str] = mapped_column(String, index=True, nullable=False) # Имя, данное пользователем
-    filepath: Mapped[str] = mapped_column(String, nullable=False, unique=True) # Путь на сервере
-    owner_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=False)
+    filepath: Mapped[str] = mapped_column(String, nullable=False) # Путь на сервере (общий для одинаковых файлов)
+    blob_digest: Mapped[Optional[str]] = mapped_column(
+        String(64), ForeignKey("audio_blobs.digest"), index=True, nullable=True
+    )
+    owner_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    size: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True) # Байты; NULL у старых записей до recount_usage
     created_at: Mapped[datetime.datetime] = mapped_column(
         DateTime(timezone=True), server_default=func.now()
     )
+    # Метаданные из заголовков самого файла (NULL, если контейнер не распознан)
+    audio_format: Mapped[Optional[str]] = mapped_column(String(8), nullable=True)
+    duration: Mapped[Optional[float]] = mapped_column(Float, nullable=True) # Секунды
+    sample_rate: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    channels: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    bitrate: Mapped[Optional[int]] = mapped_column(Integer, nullable=True) # бит/с
 
     owner: Mapped["User"] = relationship("User", back_populates="audio_files")
+
+
+class UploadSession(Base):
+    """Незавершённая докачиваемая загрузка: части пишутся в файл {id}.upload в каталоге incoming."""
+    __tablename__ = "upload_sessions"
+
+    id: Mapped[str] = mapped_column(String(32), primary_key=True) # uuid4 hex
+    owner_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("users.id", ondelete="CASCADE"), index=True, nullable=False
+    )
+    filename: Mapped[str] = mapped_column(String, nullable=False)
+    content_type: Mapped[str] = mapped_column(String, nullable=False)
+    length: Mapped[int] = mapped_column(BigInteger, nullable=False) # Заявленный полный размер
+    received: Mapped[list] = mapped_column(JSON, nullable=False, default=list) # Полученные диапазоны [[start, end), ...]
+    received_bytes: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    # Когда начат complete; пока он идёт, части не принимаются, а второй complete получает 409
+    completing_at: Mapped[Optional[datetime.datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    created_at: Mapped[datetime.datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
+    updated_at: Mapped[datetime.datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), index=True
+    )
+
+
+class RevokedToken(Base):
+    """Отозванный jti отдельного токена или sid целой сессии входа; строка нужна, пока токены не истекли."""
+    __tablename__ = "revoked_tokens"
+
+    token_id: Mapped[str] = mapped_column(String(32), primary_key=True) # jti или sid (uuid4 hex)
+    expires_at: Mapped[datetime.datetime] = mapped_column(DateTime(timezone=True), index=True, nullable=False)
+    created_at: Mapped[datetime.datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), index=True
+    )
+
+
+# Номер версии схемы (одна строка), см. app.db.migrations
+schema_version = Table(
+    "schema_version",
+    Base.metadata,
+    Column("version", Integer, nullable=False),
+)
+
+
+# Keyset-пагинация списка файлов пользователя: WHERE owner_id = ? AND (created_at, id) < (?, ?)
+Index(
+    "ix_audio_files_owner_created_id",
+    AudioFile.owner_id,
+    AudioFile.created_at.desc(),
+    AudioFile.id.desc(),
+)
+
+# Поиск по имени среди файлов пользователя: WHERE owner_id = ? AND filename ILIKE '%...%'.
+# Триграммы (pg_trgm) находят и подстроки, и префиксы; owner_id в том же GIN-индексе (btree_gin)
+Index(
+    "ix_audio_files_owner_filename_trgm",
+    AudioFile.owner_id,
+    AudioFile.filename,
+    postgresql_using="gin",
+    postgresql_ops={"filename": "gin_trgm_ops"},
+)
+
+# Очередь фонового удаления: блобы, на которые больше не ссылается ни один AudioFile
+Index(
+    "ix_audio_blobs_unreferenced",
+    AudioBlob.digest,
+    postgresql_where=AudioBlob.ref_count <= 0,
+)
@@ -1,14 +1,108 @@
+import os
+import time
+from sqlalchemy import event, exc
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from app.core import metrics
 from app.core.config import settings
 
 
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Пул соединений, который замеряет, сколько запросы ждут свободное соединение."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            metrics.DB_POOL_TIMEOUTS.inc()
+            raise
+        finally:
+            metrics.DB_POOL_CHECKOUTS.inc()
+            metrics.DB_POOL_WAIT.inc(time.perf_counter() - started)
+
+
 engine = create_async_engine(
     str(settings.DATABASE_URL),
-    pool_pre_ping=True,
+    poolclass=InstrumentedPool,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_pre_ping=settings.DB_POOL_PRE_PING,
+    # Кэш подготовленных выражений asyncpg на каждое соединение (0 — для pgbouncer в transaction mode)
+    connect_args={"prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE},
     echo=False,
 )
 
+
+# Вместо pool_pre_ping на каждой выдаче соединения проверяем только те,
+# что пролежали в пуле дольше DB_POOL_PING_IDLE_SECONDS: за это время их мог закрыть сервер или NAT.
+# Обрывы активных соединений SQLAlchemy и так распознаёт и инвалидирует пул.
+
+@event.listens_for(engine.sync_engine, "checkin")
+def _remember_checkin(dbapi_connection, connection_record):
+    connection_record.info["checked_in_at"] = time.monotonic()
+
+
+@event.listens_for(engine.sync_engine, "checkout")
+def _ping_idle_connection(dbapi_connection, connection_record, connection_proxy):
+    checked_in_at = connection_record.info.get("checked_in_at")
+    if checked_in_at is None or time.monotonic() - checked_in_at < settings.DB_POOL_PING_IDLE_SECONDS:
+        return
+    metrics.DB_POOL_LIVENESS_PINGS.inc()
+    try:
+        cursor = dbapi_connection.cursor()
+        cursor.execute("SELECT 1")
+        cursor.close()
+    except Exception:
+        metrics.DB_POOL_STALE_CONNECTIONS.inc()
+        # Пул выбросит это соединение и выдаст новое
+        raise exc.DisconnectionError()
+
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metrics_started = time.perf_counter()
+
+
+@event.listens_for(engine.sync_engine, "after_cursor_execute")
+def _record_query_time(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_metrics_started", None)
+    if started is None:
+        return
+    verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+    if verb not in ("SELECT", "INSERT", "UPDATE", "DELETE"):
+        verb = "OTHER"
+    metrics.DB_QUERY_LATENCY.observe(time.perf_counter() - started, statement=verb)
+
+
+# Соединения не переживают fork: если приложение импортировано до fork (например, gunicorn --preload),
+# дочерний процесс забывает унаследованный пул, не закрывая чужие сокеты, и открывает свои
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=lambda: engine.sync_engine.dispose(close=False))
+
+
+def pool_status() -> dict:
+    # Накопительная статистика выдачи соединений — счётчики db_pool_*_total в app.core.metrics
+    pool = engine.sync_engine.pool
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "overflow": max(pool.overflow(), 0),
+    }
+
+
+metrics.registry.gauge(
+    "db_pool",
+    "Connection pool state",
+    lambda: [((name,), value) for name, value in pool_status().items()],
+    labelnames=("stat",),
+)
+
+
 AsyncSessionLocal = sessionmaker(
     bind=engine,
     class_=AsyncSession,
@@ -20,4 +114,4 @@ AsyncSessionLocal = sessionmaker(
 
 async def get_db() -> AsyncSession:
     async with AsyncSessionLocal() as session:
-        yield session
\ No newline at end of file
+        yield session
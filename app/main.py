@@ -1,8 +1,13 @@
-from fastapi import FastAPI
+import time
+IMPORT_STARTED = time.perf_counter() # до остальных импортов, чтобы учесть и их
+
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware # Если нужен CORS для фронтенда
 from contextlib import asynccontextmanager
 
 from app.api import api_router # Импортируем наш главный роутер
+from app.core import http_client, metrics, processing, startup
+from app.core.purge import blob_purger, revocation_sync, upload_session_collector, user_cache_sync
 from app.core.config import settings
 from app.db.base import init_db
 from app.db.session import engine # Импортируем движок
@@ -10,11 +15,25 @@ from app.db.session import engine # Импортируем движок
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    print("Initializing database...")
+    started = time.perf_counter()
+    # Без DDL, если версия схемы актуальна: это один запрос
     await init_db(engine)
-    print("Database initialized.")
+    await http_client.start_client()
+    # Отозванные токены загружаются до приёма запросов, дальше синхронизируются в фоне
+    await revocation_sync.run_once()
+    revocation_sync.start()
+    user_cache_sync.start()
+    blob_purger.start()
+    upload_session_collector.start()
+    startup.mark_ready(started)
     yield
     print("Shutting down...")
+    await upload_session_collector.stop()
+    await revocation_sync.stop()
+    await user_cache_sync.stop()
+    await blob_purger.stop()
+    await http_client.close_client()
+    processing.shutdown_executor()
 
 
 app = FastAPI(
@@ -28,7 +47,16 @@ app = FastAPI(
 
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
+if settings.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+
+    @app.get("/metrics", include_in_schema=False)
+    async def read_metrics():
+        return Response(metrics.registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.get("/", tags=["Root"])
 async def read_root():
     return {"message": "Welcome to the Audio Upload Service API"}
 
+
+startup.phases["import"] = time.perf_counter() - IMPORT_STARTED
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field
 import datetime
-from typing import Optional
+from typing import List, Optional
 
 class AudioFileBase(BaseModel):
     filename: str = Field(..., description="User-provided filename for the audio")
@@ -11,7 +11,14 @@ class AudioFileCreate(AudioFileBase):
 class AudioFileUpdate(BaseModel):
      filename: Optional[str] = None
 
-class AudioFileInDBBase(AudioFileBase):
+class AudioMetadataFields(BaseModel):
+    audio_format: Optional[str] = Field(None, description="Container detected from the file contents")
+    duration: Optional[float] = Field(None, description="Duration in seconds")
+    sample_rate: Optional[int] = None
+    channels: Optional[int] = None
+    bitrate: Optional[int] = Field(None, description="Bits per second (average for VBR)")
+
+class AudioFileInDBBase(AudioFileBase, AudioMetadataFields):
     id: int
     filepath: str
     owner_id: int
@@ -23,11 +30,39 @@ class AudioFileInDBBase(AudioFileBase):
 class AudioFile(AudioFileInDBBase):
     pass
 
-class AudioFileInfo(BaseModel):
+class AudioFileInfo(AudioMetadataFields):
     id: int
     filename: str
     filepath: str
     created_at: datetime.datetime
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class AudioFilePage(BaseModel):
+    items: List[AudioFileInfo]
+    next_cursor: Optional[str] = Field(None, description="Opaque cursor for the next page, null on the last page")
+
+class UploadSessionCreate(BaseModel):
+    filename: str = Field(..., description="User-provided filename for the audio")
+    content_type: str = Field(..., description="Audio MIME type, e.g. audio/mpeg")
+    length: int = Field(..., gt=0, description="Total file size in bytes")
+
+class UploadSessionInfo(BaseModel):
+    id: str
+    filename: str
+    content_type: str
+    length: int
+    received_bytes: int
+    received: List[List[int]] = Field(..., description="Received byte ranges as [start, end) pairs")
+    missing: List[List[int]] = Field(..., description="Byte ranges still to be sent as [start, end) pairs")
+    expires_at: datetime.datetime
+
+class BatchUploadResult(BaseModel):
+    filename: Optional[str] = None
+    status_code: int = Field(..., description="HTTP status this file would have received on its own")
+    file: Optional[AudioFile] = None
+    detail: Optional[str] = None
+
+class BatchUploadResponse(BaseModel):
+    results: List[BatchUploadResult]
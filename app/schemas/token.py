@@ -10,6 +10,8 @@ class TokenPayload(BaseModel):
     sub: Optional[str] = None
     type: Optional[str] = None
     exp: Optional[int] = None
+    jti: Optional[str] = None # id токена; у токенов, выданных до появления отзыва, его нет
+    sid: Optional[str] = None # id сессии входа, общий для всех токенов одной цепочки refresh
 
 class RefreshTokenRequest(BaseModel):
     refresh_token: str
\ No newline at end of file
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from typing import Optional
 import datetime
 
@@ -35,4 +35,11 @@ class User(UserInDBBase):
 
 
 class UserInDB(UserInDBBase):
-    pass
\ No newline at end of file
+    pass
+
+
+class UserUsage(BaseModel):
+    storage_bytes: int = Field(..., description="Total size of the user's files in bytes")
+    file_count: int
+    storage_quota: Optional[int] = Field(None, description="Byte limit, null if unlimited")
+    file_quota: Optional[int] = Field(None, description="File count limit, null if unlimited")
@@ -0,0 +1,110 @@
+"""Переводит плоский каталог загрузок (файлы с uuid-именами) на контентно-адресуемые блобы.
+
+Запуск: python -m app.scripts.dedupe_uploads [--batch-size 500] [--dry-run]
+
+Скрипт можно прерывать и запускать повторно: обрабатываются только записи без blob_digest,
+а старый файл удаляется лишь после коммита пачки.
+"""
+import argparse
+import asyncio
+import re
+from pathlib import Path
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import update as sqlalchemy_update
+from sqlalchemy.future import select
+
+from app.core import storage
+from app.core.config import settings
+from app.db import crud, models
+from app.db.base import init_db
+from app.db.session import AsyncSessionLocal, engine
+
+DIGEST_RE = re.compile(r"^[0-9a-f]{64}(\.peaks)?$")
+
+
+def unlink_legacy(path: Path) -> None:
+    try:
+        path.unlink()
+    except FileNotFoundError:
+        pass
+
+
+async def migrate(batch_size: int, dry_run: bool) -> None:
+    converted = duplicates = missing = 0
+    saved_bytes = 0
+    last_id = 0
+
+    while True:
+        legacy_paths = []
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(models.AudioFile.id, models.AudioFile.filepath)
+                .filter(models.AudioFile.blob_digest.is_(None), models.AudioFile.id > last_id)
+                .order_by(models.AudioFile.id)
+                .limit(batch_size)
+            )
+            rows = result.all()
+            if not rows:
+                break
+
+            for row in rows:
+                last_id = row.id
+                path = storage.legacy_path(row.filepath)
+                if not path.is_file():
+                    print(f"AudioFile {row.id}: file {row.filepath} is missing, skipped")
+                    missing += 1
+                    continue
+
+                digest, size = await run_in_threadpool(storage.hash_file, path)
+                if dry_run:
+                    converted += 1
+                    continue
+
+                blob = await crud.acquire_blob(db, digest=digest, size=size)
+                if blob.ref_count > 1:
+                    duplicates += 1
+                    saved_bytes += size
+                # Копия под ключом блоба; старый путь остаётся рабочим, пока транзакция не закоммичена
+                await storage.get_backend().copy_in(path, blob.filepath)
+                await db.execute(
+                    sqlalchemy_update(models.AudioFile)
+                    .where(models.AudioFile.id == row.id)
+                    .values(blob_digest=digest, filepath=blob.filepath)
+                    .execution_options(synchronize_session=False)
+                )
+                legacy_paths.append(path)
+                converted += 1
+
+            await db.commit()
+
+        for path in legacy_paths:
+            await run_in_threadpool(unlink_legacy, path)
+        print(f"Processed up to AudioFile {last_id}: {converted} converted, {duplicates} duplicates")
+
+    leftovers = [
+        entry for entry in Path(settings.UPLOADS_DIR).iterdir()
+        if entry.is_file() and not DIGEST_RE.match(entry.name)
+    ]
+    action = "would convert" if dry_run else "converted"
+    print(
+        f"Done: {action} {converted} files, {duplicates} duplicates "
+        f"({saved_bytes} bytes freed), {missing} missing"
+    )
+    if leftovers and not dry_run:
+        print(f"{len(leftovers)} files in {settings.UPLOADS_DIR} are not referenced by any AudioFile and were left untouched")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Convert a flat uploads directory to content-addressed blobs")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true", help="Only hash files, do not touch rows or files")
+    args = parser.parse_args()
+
+    await init_db(engine)
+    await migrate(args.batch_size, args.dry_run)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
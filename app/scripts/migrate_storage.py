@@ -0,0 +1,110 @@
+"""Переносит блобы из плоского каталога загрузок в раскладку ab/cd/<digest> текущего бэкенда.
+
+Запуск: python -m app.scripts.migrate_storage [--batch-size 200] [--dry-run]
+
+Перенос онлайн: сервис продолжает работать. Строка блоба блокируется на время переноса
+(новая загрузка того же содержимого подождёт и получит уже новый ключ), файл сначала
+появляется под новым ключом, затем в одной транзакции меняются пути в audio_blobs
+и audio_files, и только после коммита удаляется старый файл. Скрипт можно прерывать
+и запускать повторно. С STORAGE_BACKEND=s3 файлы загружаются в бакет.
+"""
+import argparse
+import asyncio
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func, update as sqlalchemy_update
+from sqlalchemy.future import select
+
+from app.core import storage
+from app.db import models
+from app.db.base import init_db
+from app.db.session import AsyncSessionLocal, engine
+
+
+def _is_file(path) -> bool:
+    return path.is_file()
+
+
+async def migrate(batch_size: int, dry_run: bool) -> None:
+    backend = storage.get_backend()
+    moved = missing = 0
+    last_digest = ""
+
+    while True:
+        legacy_paths = []
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(models.AudioBlob.digest, models.AudioBlob.filepath)
+                .filter(
+                    ~models.AudioBlob.filepath.regexp_match(storage.BLOB_KEY_RE.pattern),
+                    models.AudioBlob.digest > last_digest,
+                )
+                .order_by(models.AudioBlob.digest)
+                .limit(batch_size)
+                .with_for_update()
+            )
+            rows = result.all()
+            if not rows:
+                break
+
+            for row in rows:
+                last_digest = row.digest
+                src = storage.legacy_path(row.filepath)
+                if not await run_in_threadpool(_is_file, src):
+                    print(f"Blob {row.digest}: file {row.filepath} is missing, skipped")
+                    missing += 1
+                    continue
+                moved += 1
+                if dry_run:
+                    continue
+
+                key = storage.blob_key(row.digest)
+                await backend.copy_in(src, key)
+                await db.execute(
+                    sqlalchemy_update(models.AudioBlob)
+                    .where(models.AudioBlob.digest == row.digest)
+                    .values(filepath=key)
+                    .execution_options(synchronize_session=False)
+                )
+                await db.execute(
+                    sqlalchemy_update(models.AudioFile)
+                    .where(models.AudioFile.blob_digest == row.digest)
+                    .values(filepath=key)
+                    .execution_options(synchronize_session=False)
+                )
+                # Пики из плоского каталога не переносим: они пересчитаются при первом запросе
+                legacy_paths += [src, src.with_name(f"{src.name}.peaks")]
+
+            await db.commit()
+
+        await storage.remove_files(legacy_paths)
+        print(f"Processed blobs up to {last_digest}: {moved} moved, {missing} missing")
+
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(func.count(models.AudioFile.id)).filter(models.AudioFile.blob_digest.is_(None))
+        )
+        not_deduplicated = result.scalar_one()
+
+    action = "would move" if dry_run else "moved"
+    print(f"Done: {action} {moved} blobs, {missing} missing")
+    if not_deduplicated:
+        print(
+            f"{not_deduplicated} audio files have no blob yet; "
+            "run python -m app.scripts.dedupe_uploads first and then this script again"
+        )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Move flat-directory blobs to the sharded storage layout")
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would be moved")
+    args = parser.parse_args()
+
+    await init_db(engine)
+    await migrate(args.batch_size, args.dry_run)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
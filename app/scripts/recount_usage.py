@@ -0,0 +1,96 @@
+"""Заполняет счётчики места (users.storage_bytes, users.file_count) по существующим записям.
+
+Запуск: python -m app.scripts.recount_usage [--batch-size 1000]
+
+Нужен один раз после обновления (и на случай расхождения счётчиков). Сервис может работать:
+строки пользователей пачки блокируются, поэтому их загрузки и удаления ждут пересчёта.
+"""
+import argparse
+import asyncio
+
+from sqlalchemy import func, update as sqlalchemy_update
+from sqlalchemy.future import select
+
+from app.db import models
+from app.db.base import init_db
+from app.db.session import AsyncSessionLocal, engine
+
+
+async def backfill_sizes() -> int:
+    # Размер старых записей берётся из их блоба; записи без блоба сначала переводит dedupe_uploads
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            sqlalchemy_update(models.AudioFile)
+            .where(
+                models.AudioFile.size.is_(None),
+                models.AudioFile.blob_digest == models.AudioBlob.digest,
+            )
+            .values(size=models.AudioBlob.size)
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        return result.rowcount
+
+
+async def recount(batch_size: int) -> None:
+    last_id = 0
+    users = 0
+    while True:
+        async with AsyncSessionLocal() as db:
+            # Сначала блокировки, потом подсчёт: UPDATE увидит всё, что закоммичено до него
+            result = await db.execute(
+                select(models.User.id)
+                .filter(models.User.id > last_id)
+                .order_by(models.User.id)
+                .limit(batch_size)
+                .with_for_update()
+            )
+            ids = result.scalars().all()
+            if not ids:
+                break
+
+            owned = models.AudioFile.owner_id == models.User.id
+            await db.execute(
+                sqlalchemy_update(models.User)
+                .where(models.User.id.in_(ids))
+                .values(
+                    storage_bytes=select(func.coalesce(func.sum(models.AudioFile.size), 0))
+                    .filter(owned)
+                    .scalar_subquery(),
+                    file_count=select(func.count(models.AudioFile.id)).filter(owned).scalar_subquery(),
+                    updated_at=models.User.updated_at,
+                )
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+
+        last_id = ids[-1]
+        users += len(ids)
+        print(f"Recounted {users} users")
+
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(func.count(models.AudioFile.id)).filter(models.AudioFile.size.is_(None))
+        )
+        unknown = result.scalar_one()
+    if unknown:
+        print(
+            f"{unknown} audio files have no known size and are counted as 0 bytes; "
+            "run python -m app.scripts.dedupe_uploads first and then this script again"
+        )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Recalculate per-user storage usage counters")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    await init_db(engine)
+    filled = await backfill_sizes()
+    print(f"Filled in size for {filled} audio files")
+    await recount(args.batch_size)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,111 @@
+"""Продакшен-запуск: несколько процессов uvicorn на всех доступных ядрах.
+
+    python -m app.server [--host 0.0.0.0] [--port 8000] [--workers N]
+
+Проверка JWT, валидация pydantic и кодирование JSON занимают CPU, а один процесс использует одно ядро
+из-за GIL. Поэтому сервер запускает WEB_WORKERS процессов (0 — по числу ядер, доступных процессу
+с учётом affinity и квоты cgroup), которые принимают соединения с общего сокета. Каждый воркер
+стартует заново (spawn) и сам импортирует приложение, поэтому пул соединений с базой, HTTP-клиент
+Yandex и фоновые задачи у каждого свои.
+
+Состояние в памяти у воркеров тоже своё и сходится через БД с задержкой:
+* кэш пользователей — до USER_CACHE_SYNC_SECONDS другие воркеры могут пускать удалённого или изменённого
+  пользователя по старому снимку (права суперпользователя всегда проверяются по БД);
+* отзыв токенов — до TOKEN_REVOCATION_SYNC_SECONDS;
+* лимиты допуска загрузок (UPLOAD_*) действуют в пределах одного воркера.
+
+Сигналы главному процессу:
+* SIGTERM/SIGINT — воркеры перестают принимать соединения, дожидаются начатых запросов
+  (не дольше WEB_GRACEFUL_TIMEOUT) и выполняют shutdown lifespan;
+* SIGHUP (при нескольких воркерах) — воркеры по одному заменяются новыми:
+  старый останавливается, только когда новый готов;
+* SIGTTIN/SIGTTOU — добавить или убрать воркер.
+Упавший воркер перезапускается автоматически.
+"""
+import argparse
+import math
+import os
+from typing import Optional
+
+import uvicorn
+
+from app.core.config import settings
+
+
+def _cgroup_cpu_limit() -> Optional[float]:
+    """Квота CPU контейнера в ядрах (cgroup v2, затем v1); None, если квоты нет."""
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()[:2]
+        return None if quota == "max" else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+            period = int(f.read())
+    except (OSError, ValueError):
+        return None
+    return quota / period if quota > 0 and period > 0 else None
+
+
+def available_cpus() -> int:
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    limit = _cgroup_cpu_limit()
+    if limit is not None:
+        cpus = min(cpus, max(math.ceil(limit), 1))
+    return cpus
+
+
+def _module_available(name: str) -> bool:
+    try:
+        __import__(name)
+    except ImportError:
+        return False
+    return True
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the service with one uvicorn process per CPU core")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=settings.WEB_WORKERS, help="0 — по числу доступных ядер")
+    parser.add_argument("--access-log", action="store_true", help="Log every request (costs CPU under load)")
+    args = parser.parse_args()
+
+    cpus = available_cpus()
+    workers = args.workers or cpus
+    # Пулы для разбора аудио есть в каждом воркере: делим ядра, а не заводим по пулу на все ядра в каждом
+    if workers > 1 and not settings.PROCESSING_WORKERS:
+        os.environ["PROCESSING_WORKERS"] = str(max(cpus // workers, 1))
+
+    max_requests = settings.WEB_MAX_REQUESTS if workers > 1 else None
+
+    loop = "uvloop" if _module_available("uvloop") else "asyncio"
+    http = "httptools" if _module_available("httptools") else "h11"
+    if (loop, http) != ("uvloop", "httptools"):
+        print(f"uvloop or httptools is not installed, using {loop}/{http}")
+    print(f"Starting {workers} worker(s) on {args.host}:{args.port} ({cpus} CPUs available, {loop}/{http})")
+
+    uvicorn.run(
+        "app.main:app",
+        host=args.host,
+        port=args.port,
+        workers=workers,
+        loop=loop,
+        http=http,
+        access_log=args.access_log,
+        timeout_graceful_shutdown=settings.WEB_GRACEFUL_TIMEOUT,
+        # Единственный воркер после лимита никто не перезапустит
+        limit_max_requests=max_requests,
+        # Разброс, чтобы воркеры не перезапускались одновременно
+        limit_max_requests_jitter=(max_requests or 0) // 10,
+    )
+
+
+if __name__ == "__main__":
+    main()
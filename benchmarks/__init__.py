@@ -0,0 +1,24 @@
+import os
+
+# Значения, достаточные для импорта app без .env: бенчмарки не ходят в сеть
+OFFLINE_ENV = {
+    "SECRET_KEY": "benchmark-secret-key-not-for-production-use",
+    "POSTGRES_SERVER": "localhost",
+    "POSTGRES_USER": "postgres",
+    "POSTGRES_PASSWORD": "postgres",
+    "POSTGRES_DB": "benchmark",
+    "YANDEX_CLIENT_ID": "benchmark-client",
+    "YANDEX_CLIENT_SECRET": "benchmark-secret",
+    "YANDEX_REDIRECT_URI": "http://127.0.0.1:8000/api/v1/auth/yandex/callback",
+    "FIRST_SUPERUSER_YANDEX_ID": "1",
+    # Бенчмарк загружает от одного пользователя и сам задаёт параллельность: лимиты допуска мешали бы замеру
+    "UPLOAD_MAX_CONCURRENT": "0",
+    "UPLOAD_MAX_BYTES_IN_FLIGHT": "0",
+    "UPLOAD_RATE_PER_USER": "0",
+}
+
+
+def configure_offline_env() -> None:
+    """Вызывать до первого импорта app: переменные окружения имеют приоритет над значениями отсюда."""
+    for key, value in OFFLINE_ENV.items():
+        os.environ.setdefault(key, value)
@@ -0,0 +1,40 @@
+"""Сравнивает два JSON-отчёта benchmarks.run: python -m benchmarks.compare old.json new.json"""
+import argparse
+import json
+from typing import Dict
+
+
+def flatten(results: dict, prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = float(value)
+    return flat
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare two benchmark reports")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    old = flatten(baseline["results"])
+    new = flatten(candidate["results"])
+    print(f"{'metric':<50} {baseline['revision']:>12} {candidate['revision']:>12} {'change':>9}")
+    for name in sorted(old.keys() & new.keys()):
+        change = (new[name] - old[name]) / old[name] * 100 if old[name] else 0.0
+        print(f"{name:<50} {old[name]:>12.2f} {new[name]:>12.2f} {change:>+8.1f}%")
+    for name in sorted(old.keys() ^ new.keys()):
+        print(f"{name:<50} only in {'baseline' if name in old else 'candidate'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Локальная замена oauth.yandex.ru и login.yandex.ru для тестов и бенчмарков.
+
+Отдельный запуск: python -m benchmarks.fake_yandex [--port 8900] [--latency-ms 20]
+и затем YANDEX_TOKEN_URL=http://127.0.0.1:8900/token YANDEX_USERINFO_URL=http://127.0.0.1:8900/info.
+
+Код авторизации вида "user-<N>" превращается в пользователя с id N; код "invalid" даёт 400.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import socket
+import time
+
+import uvicorn
+from fastapi import FastAPI, Form, Header, HTTPException
+
+
+def create_app(latency_ms: float = 0.0) -> FastAPI:
+    app = FastAPI(title="Fake Yandex OAuth")
+    delay = latency_ms / 1000
+
+    @app.post("/token")
+    async def token(code: str = Form(...), grant_type: str = Form(...)):
+        if delay:
+            await asyncio.sleep(delay)
+        if grant_type != "authorization_code" or code == "invalid":
+            raise HTTPException(status_code=400, detail="bad_verification_code")
+        return {"access_token": f"token-{code}", "token_type": "bearer", "expires_in": 3600}
+
+    @app.get("/info")
+    async def info(authorization: str = Header(...)):
+        if delay:
+            await asyncio.sleep(delay)
+        if not authorization.startswith("OAuth token-"):
+            raise HTTPException(status_code=401, detail="invalid token")
+        code = authorization.removeprefix("OAuth token-")
+        user_id = code.removeprefix("user-")
+        return {
+            "id": user_id,
+            "login": f"user{user_id}",
+            "default_email": f"user{user_id}@example.com",
+            "first_name": "Test",
+            "last_name": f"User{user_id}",
+            "display_name": f"user{user_id}",
+        }
+
+    return app
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def serve(port: int, latency_ms: float = 0.0) -> None:
+    uvicorn.run(create_app(latency_ms), host="127.0.0.1", port=port, log_level="warning")
+
+
+class FakeYandexServer:
+    """Поднимает фейковый сервер в отдельном процессе: with FakeYandexServer(latency_ms=20) as server: ...
+
+    Отдельный процесс, а не поток, чтобы сервер не делил GIL с измеряемым кодом.
+    """
+
+    def __init__(self, latency_ms: float = 0.0, port: int = 0):
+        self.port = port or free_port()
+        self._process = multiprocessing.get_context("spawn").Process(
+            target=serve, args=(self.port, latency_ms), daemon=True
+        )
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    @property
+    def env(self) -> dict:
+        return {
+            "YANDEX_TOKEN_URL": f"{self.base_url}/token",
+            "YANDEX_USERINFO_URL": f"{self.base_url}/info",
+        }
+
+    def __enter__(self) -> "FakeYandexServer":
+        self._process.start()
+        deadline = time.monotonic() + 10
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", self.port), timeout=0.1).close()
+                return self
+            except OSError:
+                if time.monotonic() > deadline or not self._process.is_alive():
+                    self._process.kill()
+                    raise RuntimeError("Fake Yandex server did not start")
+                time.sleep(0.05)
+
+    def __exit__(self, *exc) -> None:
+        self._process.terminate()
+        self._process.join()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fake Yandex OAuth server")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+    serve(args.port, args.latency_ms)
+
+
+if __name__ == "__main__":
+    main()
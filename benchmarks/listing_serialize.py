@@ -0,0 +1,82 @@
+"""Микробенчмарк сериализации страницы GET /audio: ORM + двойная валидация Pydantic против строк + orjson.
+
+Замеряется только подготовка ответа; загрузка строк из БД (identity map ORM) сюда не входит,
+её покрывает benchmarks.run.
+
+Запуск: python -m benchmarks.listing_serialize [--limit 1000] [--iterations 200]
+"""
+import argparse
+import datetime
+import json
+import timeit
+import tracemalloc
+
+from benchmarks import configure_offline_env
+
+configure_offline_env()
+
+from pydantic import TypeAdapter  # noqa: E402
+
+from app.api.endpoints.audio import LIST_COLUMNS  # noqa: E402
+from app.core.responses import FastJSONResponse  # noqa: E402
+from app.db import models  # noqa: E402
+from app.schemas import audio as audio_schemas  # noqa: E402
+
+
+def make_rows(limit: int) -> list:
+    base = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+    return [
+        {
+            "id": n,
+            "filename": f"recording-{n}.wav",
+            "filepath": f"ab/cd/{n:064x}",
+            "created_at": base + datetime.timedelta(seconds=n),
+            "audio_format": "wav",
+            "duration": 123.456,
+            "sample_rate": 44100,
+            "channels": 2,
+            "bitrate": 1411200,
+        }
+        for n in range(limit)
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--limit", type=int, default=1000)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    rows = make_rows(args.limit)
+    orm_objects = [models.AudioFile(owner_id=1, blob_digest=None, **row) for row in rows]
+    page_adapter = TypeAdapter(audio_schemas.AudioFilePage)
+
+    def orm_path() -> bytes:
+        # Как было: model_validate на каждый объект, затем проверка и сериализация response_model
+        page = audio_schemas.AudioFilePage(
+            items=[audio_schemas.AudioFileInfo.model_validate(f) for f in orm_objects],
+            next_cursor=None,
+        )
+        validated = page_adapter.validate_python(page, from_attributes=True)
+        content = page_adapter.dump_python(validated, mode="json")
+        return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode()
+
+    def rows_path() -> bytes:
+        return FastJSONResponse({"items": [{c: row[c] for c in LIST_COLUMNS} for row in rows], "next_cursor": None}).body
+
+    assert json.loads(orm_path()) == json.loads(rows_path()), "fast path output differs"
+
+    results = {}
+    for name, func in (("orm + pydantic", orm_path), ("rows + orjson", rows_path)):
+        elapsed = timeit.timeit(func, number=args.iterations)
+        tracemalloc.start()
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results[name] = elapsed / args.iterations
+        print(f"{name:16} {elapsed / args.iterations * 1e3:8.2f} ms/page  peak {peak / 1024:8.0f} KiB")
+    print(f"speedup:         {results['orm + pydantic'] / results['rows + orjson']:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""Масштабирование python -m app.server по ядрам: пропускная способность при 1, 2, 4... воркерах.
+
+    python -m benchmarks.scaling [--workers 1 2 4] [--duration 10] [--path /api/v1/users/me]
+
+Нужен PostgreSQL (BENCH_DATABASE_URL или --database-url, как у benchmarks.run; схема не пересоздаётся),
+Yandex заменён локальной заглушкой. Сервер с k воркерами привязывается к k ядрам (sched_setaffinity),
+а генератор нагрузки — к остальным, поэтому они не отнимают CPU друг у друга: на машине с 8 ядрами
+имеет смысл --workers 1 2 4, остальные 4 ядра нагружают. По умолчанию запрос — /users/me с токеном:
+проверка JWT, кэш пользователя и сериализация ответа, то есть CPU, а не база.
+
+При линейном масштабировании speedup близок к числу воркеров, efficiency — к 1. Если с ростом воркеров
+пропускная способность перестала расти, проверьте, не упёрся ли в CPU сам генератор нагрузки
+(--load-processes) или база (db_pool_wait_seconds_total и db_pool в /metrics).
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+import time
+from typing import List, Optional, Set, Tuple
+
+import httpx
+
+from benchmarks import configure_offline_env
+from benchmarks.fake_yandex import FakeYandexServer, free_port
+from benchmarks.run import DEFAULT_DATABASE_URL, expect
+
+
+def cpu_list() -> List[int]:
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        return list(range(os.cpu_count() or 1))
+
+
+def pin(cpus: Optional[Set[int]]) -> None:
+    if cpus and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+
+
+def start_server(port: int, cpus: Set[int], timeout: float) -> subprocess.Popen:
+    # --workers 0: сервер сам выбирает число воркеров по доступным ему ядрам
+    server = subprocess.Popen(
+        [sys.executable, "-m", "app.server", "--host", "127.0.0.1", "--port", str(port), "--workers", "0"],
+        preexec_fn=lambda: pin(cpus),
+    )
+    started = time.monotonic()
+    while time.monotonic() - started < timeout:
+        if server.poll() is not None:
+            raise RuntimeError(f"server exited with code {server.returncode}")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/", timeout=0.5).status_code == 200:
+                return server
+        except httpx.TransportError:
+            pass
+        time.sleep(0.05)
+    stop_server(server)
+    raise RuntimeError(f"server was not ready within {timeout}s")
+
+
+def stop_server(server: subprocess.Popen) -> None:
+    server.send_signal(signal.SIGTERM)
+    try:
+        server.wait(timeout=60)
+    except subprocess.TimeoutExpired:
+        server.kill()
+        server.wait()
+
+
+async def _load(url: str, headers: dict, connections: int, duration: float) -> Tuple[int, int]:
+    done = errors = 0
+    deadline = time.monotonic() + duration
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+
+    async with httpx.AsyncClient(headers=headers, limits=limits, timeout=30) as client:
+        async def worker() -> None:
+            nonlocal done, errors
+            while time.monotonic() < deadline:
+                try:
+                    response = await client.get(url)
+                    if response.status_code == 200:
+                        done += 1
+                    else:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+
+        await asyncio.gather(*(worker() for _ in range(connections)))
+    return done, errors
+
+
+def load_process(url: str, headers: dict, connections: int, duration: float, cpus: Optional[Set[int]]) -> Tuple[int, int]:
+    pin(cpus)
+    return asyncio.run(_load(url, headers, connections, duration))
+
+
+def measure(url: str, headers: dict, args, cpus: Optional[Set[int]]) -> Tuple[float, int]:
+    per_process = max(args.connections // args.load_processes, 1)
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(args.load_processes) as pool:
+        # Прогрев: соединения, кэши пользователя и токена в каждом воркере
+        pool.starmap(load_process, [(url, headers, per_process, 1.0, cpus)] * args.load_processes)
+        started = time.perf_counter()
+        results = pool.starmap(load_process, [(url, headers, per_process, args.duration, cpus)] * args.load_processes)
+        elapsed = time.perf_counter() - started
+    done = sum(r[0] for r in results)
+    errors = sum(r[1] for r in results)
+    return done / elapsed, errors
+
+
+def main() -> None:
+    cpus = cpu_list()
+    default_workers = [n for n in (1, 2, 4, 8, 16, 32) if n <= max(len(cpus) // 2, 1)]
+
+    parser = argparse.ArgumentParser(description="Throughput of app.server by number of workers")
+    parser.add_argument("--database-url", default=os.environ.get("BENCH_DATABASE_URL", DEFAULT_DATABASE_URL))
+    parser.add_argument("--workers", type=int, nargs="+", default=default_workers)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--connections", type=int, default=64)
+    parser.add_argument("--load-processes", type=int, default=0, help="0 — по числу ядер, не занятых сервером")
+    parser.add_argument("--path", default="/api/v1/users/me")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    server_cpus = max(args.workers)
+    if server_cpus >= len(cpus):
+        print(f"Only {len(cpus)} CPUs: the server and the load generator will compete for cores")
+        load_cpus = None
+    else:
+        load_cpus = set(cpus[server_cpus:])
+    args.load_processes = args.load_processes or (len(load_cpus) if load_cpus else 1)
+
+    configure_offline_env()
+    os.environ["DATABASE_URL"] = args.database_url
+
+    results = []
+    with FakeYandexServer() as yandex:
+        os.environ.update(yandex.env)
+        for workers in args.workers:
+            port = free_port()
+            server = start_server(port, set(cpus[:workers]), args.timeout)
+            try:
+                base_url = f"http://127.0.0.1:{port}"
+                tokens = expect(httpx.get(f"{base_url}/api/v1/auth/yandex/callback", params={"code": "user-1"})).json()
+                headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+                rps, errors = measure(base_url + args.path, headers, args, load_cpus)
+            finally:
+                stop_server(server)
+            results.append((workers, rps, errors))
+            print(f"{workers} worker(s): {rps:.0f} req/s, {errors} errors")
+
+    base = results[0][1] / results[0][0]
+    print(f"\n{'workers':>8} {'req/s':>10} {'speedup':>8} {'efficiency':>10}")
+    for workers, rps, _ in results:
+        print(f"{workers:>8} {rps:>10.0f} {rps / results[0][1]:>8.2f} {rps / workers / base:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Время холодного старта: импорт приложения в новом процессе и (с --serve) время до первого ответа.
+
+Запуск: python -m benchmarks.startup [--runs 5] [--serve] [--database-url postgresql+asyncpg://...]
+
+Без --serve база не нужна. С --serve запускается настоящий uvicorn, поэтому нужен PostgreSQL:
+первый запуск может создать схему, остальные показывают старт реплики при актуальной схеме.
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks import configure_offline_env
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import app.main; print(time.perf_counter() - t)"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_import() -> tuple:
+    started = time.perf_counter()
+    output = subprocess.check_output([sys.executable, "-c", IMPORT_SNIPPET], text=True)
+    return float(output.strip().splitlines()[-1]), time.perf_counter() - started
+
+
+def measure_serve(timeout: float) -> float:
+    port = free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            if server.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with code {server.returncode}")
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/", timeout=0.5).status_code == 200:
+                    return time.perf_counter() - started
+            except httpx.TransportError:
+                pass
+            time.sleep(0.01)
+        raise RuntimeError(f"server was not ready within {timeout}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def report(name: str, values: list) -> None:
+    print(f"{name:28} median {statistics.median(values):6.3f}s  min {min(values):6.3f}s  max {max(values):6.3f}s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--serve", action="store_true", help="Also start uvicorn and wait for the first response")
+    parser.add_argument("--database-url", default=os.environ.get("BENCH_DATABASE_URL"))
+    parser.add_argument("--timeout", type=float, default=30.0)
+    args = parser.parse_args()
+
+    configure_offline_env()
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+
+    imports, processes = zip(*(measure_import() for _ in range(args.runs)))
+    report("import app.main", list(imports))
+    report("interpreter + import", list(processes))
+
+    if args.serve:
+        report("spawn to first response", [measure_serve(args.timeout) for _ in range(args.runs)])
+
+
+if __name__ == "__main__":
+    main()
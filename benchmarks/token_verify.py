@@ -0,0 +1,33 @@
+"""Микробенчмарк проверки access-токена: verify_token против кэширующего TokenVerifier.
+
+Запуск: python -m benchmarks.token_verify [--iterations 100000]
+"""
+import argparse
+import timeit
+
+from benchmarks import configure_offline_env
+
+configure_offline_env()
+
+from app.core import security  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=100000)
+    args = parser.parse_args()
+
+    token = security.create_access_token(subject=42)
+    verifier = security.TokenVerifier(maxsize=1024)
+    verifier.verify(token)
+
+    uncached = timeit.timeit(lambda: security.verify_token(token), number=args.iterations)
+    cached = timeit.timeit(lambda: verifier.verify(token), number=args.iterations)
+
+    print(f"verify_token:          {uncached / args.iterations * 1e6:8.2f} us/call")
+    print(f"TokenVerifier.verify:  {cached / args.iterations * 1e6:8.2f} us/call")
+    print(f"speedup:               {uncached / cached:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
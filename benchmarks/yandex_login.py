@@ -0,0 +1,61 @@
+"""Задержка OAuth-части логина (обмен кода + user info) при одновременных входах, без сети.
+
+Запуск: python -m benchmarks.yandex_login [--logins 500] [--concurrency 50] [--latency-ms 20]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+from benchmarks import configure_offline_env
+from benchmarks.fake_yandex import FakeYandexServer
+
+
+async def run(logins: int, concurrency: int) -> list:
+    from app.core import http_client, security
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def sign_in(n: int) -> None:
+        async with semaphore:
+            started = time.perf_counter()
+            token = await security.exchange_yandex_code_for_token(f"user-{n}")
+            info = await security.get_yandex_user_info(token)
+            assert info and info["id"] == str(n)
+            latencies.append(time.perf_counter() - started)
+
+    await http_client.start_client()
+    try:
+        await asyncio.gather(*(sign_in(n) for n in range(logins)))
+    finally:
+        await http_client.close_client()
+    return latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--logins", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Artificial latency of each fake Yandex call")
+    args = parser.parse_args()
+
+    with FakeYandexServer(latency_ms=args.latency_ms) as server:
+        configure_offline_env()
+        os.environ.update(server.env)
+        started = time.perf_counter()
+        latencies = asyncio.run(run(args.logins, args.concurrency))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    quantiles = statistics.quantiles(latencies, n=100)
+    print(f"{args.logins} sign-ins, concurrency {args.concurrency}: {args.logins / elapsed:.0f} logins/s")
+    print(
+        f"p50 {quantiles[49] * 1000:.1f} ms, p95 {quantiles[94] * 1000:.1f} ms, "
+        f"p99 {quantiles[98] * 1000:.1f} ms, max {latencies[-1] * 1000:.1f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()